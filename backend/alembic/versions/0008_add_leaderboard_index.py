@@ -0,0 +1,38 @@
+"""Add composite index matching the leaderboard ordering
+
+Revision ID: 0008_add_leaderboard_index
+Revises: 0007_update_stage_data
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0008_add_leaderboard_index'
+down_revision: Union[str, None] = '0007_update_stage_data'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index users in leaderboard order so a page read is an index range scan."""
+    op.create_index(
+        'ix_users_leaderboard',
+        'users',
+        [
+            sa.text('score DESC'),
+            sa.text('correct_results DESC'),
+            sa.text('lone_wolf_victories DESC'),
+            sa.text('defeats ASC'),
+            sa.text('id ASC'),
+        ],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Drop the leaderboard index."""
+    op.drop_index('ix_users_leaderboard', table_name='users')
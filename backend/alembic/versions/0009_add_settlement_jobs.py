@@ -0,0 +1,54 @@
+"""Add settlement_jobs queue table
+
+Revision ID: 0009_add_settlement_jobs
+Revises: 0008_add_leaderboard_index
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0009_add_settlement_jobs'
+down_revision: Union[str, None] = '0008_add_leaderboard_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the queue of background match settlements."""
+    op.create_table('settlement_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('match_id', sa.Integer(), nullable=False),
+        sa.Column('home_score', sa.Integer(), nullable=False),
+        sa.Column('away_score', sa.Integer(), nullable=False),
+        sa.Column('previous_home_score', sa.Integer(), nullable=True),
+        sa.Column('previous_away_score', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('bets_settled', sa.Integer(), nullable=True),
+        sa.Column('users_updated', sa.Integer(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', postgresql.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('started_at', postgresql.TIMESTAMP(), nullable=True),
+        sa.Column('finished_at', postgresql.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['match_id'], ['matches.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Workers only ever look for unfinished jobs
+    op.create_index(
+        'ix_settlement_jobs_unfinished',
+        'settlement_jobs',
+        ['match_id', 'id'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    """Drop the settlement queue."""
+    op.drop_index('ix_settlement_jobs_unfinished', table_name='settlement_jobs')
+    op.drop_table('settlement_jobs')
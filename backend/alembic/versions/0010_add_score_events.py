@@ -0,0 +1,71 @@
+"""Add score_events points ledger
+
+Revision ID: 0010_add_score_events
+Revises: 0009_add_settlement_jobs
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0010_add_score_events'
+down_revision: Union[str, None] = '0009_add_settlement_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the ledger and backfill it so it adds up to the current scores."""
+    op.create_table('score_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('match_id', sa.Integer(), nullable=True),
+        sa.Column('stage_id', sa.Integer(), nullable=True),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('created_at', postgresql.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['match_id'], ['matches.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['stage_id'], ['stages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Covering indexes so standings as of a stage or a timestamp are index-only scans
+    op.create_index(
+        'ix_score_events_stage_id_user_id', 'score_events', ['stage_id', 'user_id'],
+        unique=False, postgresql_include=['delta'],
+    )
+    op.create_index(
+        'ix_score_events_created_at_user_id', 'score_events', ['created_at', 'user_id'],
+        unique=False, postgresql_include=['delta'],
+    )
+
+    conn = op.get_bind()
+    # Points currently held by bets of settled matches
+    conn.execute(sa.text("""
+        INSERT INTO score_events (user_id, match_id, stage_id, delta, created_at)
+        SELECT b.user_id, b.match_id, m.stage_id, b.points_awarded, COALESCE(m.updated_at, now())
+        FROM bets AS b
+        JOIN matches AS m ON m.id = b.match_id
+        WHERE m.home_score IS NOT NULL
+          AND m.away_score IS NOT NULL
+          AND b.points_awarded <> 0
+    """))
+    # Opening balance for whatever part of users.score does not come from bets
+    conn.execute(sa.text("""
+        INSERT INTO score_events (user_id, match_id, stage_id, delta, created_at)
+        SELECT u.id, NULL, NULL, u.score - COALESCE(SUM(e.delta), 0), u.created_at
+        FROM users AS u
+        LEFT JOIN score_events AS e ON e.user_id = u.id
+        GROUP BY u.id, u.score, u.created_at
+        HAVING u.score - COALESCE(SUM(e.delta), 0) <> 0
+    """))
+
+
+def downgrade() -> None:
+    """Drop the ledger."""
+    op.drop_index('ix_score_events_created_at_user_id', table_name='score_events')
+    op.drop_index('ix_score_events_stage_id_user_id', table_name='score_events')
+    op.drop_table('score_events')
@@ -0,0 +1,78 @@
+"""Add user_stage_points per-stage aggregates
+
+Revision ID: 0011_add_user_stage_points
+Revises: 0010_add_score_events
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0011_add_user_stage_points'
+down_revision: Union[str, None] = '0010_add_score_events'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the per-stage aggregates and fill them from the settled bets."""
+    op.create_table('user_stage_points',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('stage_id', sa.Integer(), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('exact_hits', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('lone_wolves', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('defeats', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['stage_id'], ['stages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'stage_id')
+    )
+    op.create_index(
+        'ix_user_stage_points_leaderboard',
+        'user_stage_points',
+        [
+            'stage_id',
+            sa.text('points DESC'),
+            sa.text('exact_hits DESC'),
+            sa.text('lone_wolves DESC'),
+            sa.text('defeats ASC'),
+            'user_id',
+        ],
+        unique=False,
+    )
+
+    op.execute("""
+        WITH settled_bets AS (
+            SELECT b.user_id,
+                   m.stage_id,
+                   b.points_awarded,
+                   (b.home_score_prediction = m.home_score
+                    AND b.away_score_prediction = m.away_score) AS is_exact,
+                   COUNT(*) FILTER (
+                       WHERE b.home_score_prediction = m.home_score
+                         AND b.away_score_prediction = m.away_score
+                   ) OVER (PARTITION BY b.match_id) AS exact_hits
+            FROM bets AS b
+            JOIN matches AS m ON m.id = b.match_id
+            WHERE m.home_score IS NOT NULL
+              AND m.away_score IS NOT NULL
+        )
+        INSERT INTO user_stage_points (user_id, stage_id, points, exact_hits, lone_wolves, defeats)
+        SELECT user_id,
+               stage_id,
+               SUM(points_awarded),
+               COUNT(*) FILTER (WHERE is_exact),
+               COUNT(*) FILTER (WHERE is_exact AND exact_hits = 1),
+               COUNT(*) FILTER (WHERE points_awarded = 0)
+        FROM settled_bets
+        GROUP BY user_id, stage_id
+    """)
+
+
+def downgrade() -> None:
+    """Drop the per-stage aggregates."""
+    op.drop_index('ix_user_stage_points_leaderboard', table_name='user_stage_points')
+    op.drop_table('user_stage_points')
@@ -0,0 +1,96 @@
+"""Add user_rank_snapshots per-stage standings history
+
+Revision ID: 0012_add_user_rank_snapshots
+Revises: 0011_add_user_stage_points
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0012_add_user_rank_snapshots'
+down_revision: Union[str, None] = '0011_add_user_stage_points'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the snapshots and take one for every fully settled stage."""
+    op.create_table('user_rank_snapshots',
+        sa.Column('stage_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=False),
+        sa.Column('correct_results', sa.Integer(), nullable=False),
+        sa.Column('lone_wolf_victories', sa.Integer(), nullable=False),
+        sa.Column('defeats', sa.Integer(), nullable=False),
+        sa.Column('created_at', postgresql.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['stage_id'], ['stages.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('stage_id', 'user_id')
+    )
+    op.create_index(
+        'ix_user_rank_snapshots_user_id_stage_id',
+        'user_rank_snapshots',
+        ['user_id', 'stage_id'],
+        unique=False,
+    )
+
+    op.execute("""
+        WITH targets AS (
+            SELECT s.id, s.date
+            FROM stages AS s
+            WHERE EXISTS (SELECT 1 FROM matches AS m WHERE m.stage_id = s.id)
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM matches AS m
+                  WHERE m.stage_id = s.id
+                    AND (m.home_score IS NULL OR m.away_score IS NULL)
+              )
+        ),
+        openings AS (
+            SELECT user_id, SUM(delta) AS points
+            FROM score_events
+            WHERE match_id IS NULL
+            GROUP BY user_id
+        ),
+        totals AS (
+            SELECT t.id AS stage_id,
+                   u.id AS user_id,
+                   COALESCE(o.points, 0) + COALESCE(SUM(p.points), 0) AS score,
+                   COALESCE(SUM(p.exact_hits), 0) AS correct_results,
+                   COALESCE(SUM(p.lone_wolves), 0) AS lone_wolf_victories,
+                   COALESCE(SUM(p.defeats), 0) AS defeats
+            FROM targets AS t
+            CROSS JOIN users AS u
+            LEFT JOIN openings AS o ON o.user_id = u.id
+            LEFT JOIN (
+                user_stage_points AS p
+                JOIN stages AS ps ON ps.id = p.stage_id
+            ) ON p.user_id = u.id AND ps.date <= t.date
+            GROUP BY t.id, u.id, o.points
+        )
+        INSERT INTO user_rank_snapshots
+            (stage_id, user_id, rank, score, correct_results, lone_wolf_victories, defeats)
+        SELECT stage_id,
+               user_id,
+               RANK() OVER (
+                   PARTITION BY stage_id
+                   ORDER BY score DESC, correct_results DESC, lone_wolf_victories DESC, defeats ASC
+               ),
+               score,
+               correct_results,
+               lone_wolf_victories,
+               defeats
+        FROM totals
+    """)
+
+
+def downgrade() -> None:
+    """Drop the snapshots."""
+    op.drop_index('ix_user_rank_snapshots_user_id_stage_id', table_name='user_rank_snapshots')
+    op.drop_table('user_rank_snapshots')
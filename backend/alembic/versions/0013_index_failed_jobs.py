@@ -0,0 +1,41 @@
+"""Cover failed jobs in the partial index of blocking settlement jobs
+
+Revision ID: 0013_index_failed_jobs
+Revises: 0012_add_user_rank_snapshots
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0013_index_failed_jobs'
+down_revision: Union[str, None] = '0012_add_user_rank_snapshots'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index every job that holds back later jobs of its match, failed ones included."""
+    op.drop_index('ix_settlement_jobs_unfinished', table_name='settlement_jobs')
+    op.create_index(
+        'ix_settlement_jobs_blocking',
+        'settlement_jobs',
+        ['match_id', 'id'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'running', 'failed')"),
+    )
+
+
+def downgrade() -> None:
+    """Restore the index of pending and running jobs only."""
+    op.drop_index('ix_settlement_jobs_blocking', table_name='settlement_jobs')
+    op.create_index(
+        'ix_settlement_jobs_unfinished',
+        'settlement_jobs',
+        ['match_id', 'id'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('pending', 'running')"),
+    )
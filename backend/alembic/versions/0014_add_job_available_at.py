@@ -0,0 +1,31 @@
+"""Add available_at to settlement_jobs so failed attempts retry after a delay
+
+Revision ID: 0014_add_job_available_at
+Revises: 0013_index_failed_jobs
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0014_add_job_available_at'
+down_revision: Union[str, None] = '0013_index_failed_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the time before which a job is not claimed; existing jobs are available at once."""
+    op.add_column(
+        'settlement_jobs',
+        sa.Column('available_at', postgresql.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Drop the retry delay column."""
+    op.drop_column('settlement_jobs', 'available_at')
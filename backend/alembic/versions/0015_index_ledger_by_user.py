@@ -0,0 +1,29 @@
+"""Index the score ledger by user and match
+
+Revision ID: 0015_index_ledger_by_user
+Revises: 0014_add_job_available_at
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0015_index_ledger_by_user'
+down_revision: Union[str, None] = '0014_add_job_available_at'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Covering index so reconciliation reads the ledger of a few users without scanning it."""
+    op.create_index(
+        'ix_score_events_user_id_match_id', 'score_events', ['user_id', 'match_id'],
+        unique=False, postgresql_include=['delta'],
+    )
+
+
+def downgrade() -> None:
+    """Drop the per-user ledger index."""
+    op.drop_index('ix_score_events_user_id_match_id', table_name='score_events')
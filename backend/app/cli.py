@@ -0,0 +1,37 @@
+import argparse
+import json
+import sys
+from sqlmodel import Session
+from .db import engine
+from .services.reconciliation import SettlementInProgress, reconcile
+from .services.settlement import invalidate_score_caches
+
+
+def run_reconcile(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        try:
+            report = reconcile(session, repair=args.repair)
+        except SettlementInProgress as e:
+            sys.exit(str(e))
+    if report["repaired"]:
+        invalidate_score_caches()
+    print(json.dumps(report, indent=2, default=str))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="EspoCityLeague maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reconcile_parser = commands.add_parser(
+        "reconcile",
+        help="Recompute bet points, scores and tie-breaking stats and report differences",
+    )
+    reconcile_parser.add_argument("--repair", action="store_true", help="Write the recomputed values back")
+    reconcile_parser.set_defaults(handler=run_reconcile)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
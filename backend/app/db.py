@@ -1,6 +1,8 @@
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
 def get_database_url() -> str:
@@ -16,8 +18,15 @@ def get_database_url() -> str:
 
 
 engine = create_engine(get_database_url(), echo=False, pool_pre_ping=True)
+# Same database through psycopg's async driver, used by the hot read paths
+async_engine = create_async_engine(get_database_url(), echo=False, pool_pre_ping=True)
 
 
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
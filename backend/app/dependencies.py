@@ -1,20 +1,23 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlmodel import Session, select
-from .db import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .db import get_async_session
 from .security import decode_token
 from .models.user import User
+from .services.user_cache import AuthenticatedUser, user_cache
 
 security = HTTPBearer()
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: Session = Depends(get_session)
-):
-    """Get current authenticated user from JWT token"""
+async def _authenticate(token: str, session: AsyncSession) -> AuthenticatedUser:
+    """Resolve a JWT to its user
+
+    Validated users are served from a per-process cache, so steady polling
+    does not touch the database.
+    """
     try:
-        payload = decode_token(credentials.credentials)
+        payload = decode_token(token)
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(
@@ -23,8 +26,12 @@ async def get_current_user(
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
+        cached = user_cache.get(int(user_id))
+        if cached is not None:
+            return cached
+        
         # Fetch the actual user object from the database
-        user = session.exec(select(User).where(User.id == int(user_id))).first()
+        user = (await session.exec(select(User).where(User.id == int(user_id)))).first()
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,10 +39,31 @@ async def get_current_user(
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        return user
+        authenticated = AuthenticatedUser.from_user(user)
+        user_cache.put(authenticated)
+        return authenticated
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_async_session)
+) -> AuthenticatedUser:
+    """Get current authenticated user from JWT token"""
+    return await _authenticate(credentials.credentials, session)
+
+
+async def get_stream_user(
+    token: str = Query(..., description="JWT access token"),
+    session: AsyncSession = Depends(get_async_session)
+) -> AuthenticatedUser:
+    """Get current authenticated user from a token query parameter, for EventSource clients"""
+    user = await _authenticate(token, session)
+    # The stream outlives the lookup, do not keep a pooled connection for it
+    await session.close()
+    return user
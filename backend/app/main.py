@@ -1,20 +1,34 @@
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .db import engine
+from .db import engine, async_engine
+from .dependencies import AuthenticatedUser, get_current_user
+from . import metrics
+from .services import password_hashing
+from .services.bet_writer import BET_WRITE_BUFFER_ENABLED, BET_WRITE_RETRY_AFTER_SECONDS, BetWriterBusy, bet_writer
+from .services.broadcaster import broadcaster
+from .services.kickoff_index import kickoff_index
+from .services.settlement_worker import settlement_worker
 from .routers.teams import router as teams_router
 from .routers.matches import router as matches_router
 from .routers.bets import router as bets_router
 from .routers.auth import router as auth_router
 from .routers.leaderboard import router as leaderboard_router
 from .routers.stages import router as stages_router
+from .routers.settlements import router as settlements_router
+from .routers.events import router as events_router
 # Import models to ensure they're registered with SQLModel
 from .models.user import User
 from .models.team import Team
 from .models.stage import Stage
 from .models.match import Match
 from .models.bet import Bet
+from .models.settlement import SettlementJob
+from .models.score_event import ScoreEvent
+from .models.stage_points import UserStagePoints
+from .models.rank_snapshot import UserRankSnapshot
 
 
 @asynccontextmanager
@@ -22,8 +36,24 @@ async def lifespan(app: FastAPI):
     # Startup: ensure DB connectivity
     with engine.connect() as _:
         pass
+    # Late bets are rejected from memory; the index follows schedule changes of every worker
+    kickoff_index.start()
+    # Optional group commit of bet writes for the kickoff rush
+    if BET_WRITE_BUFFER_ENABLED:
+        bet_writer.start()
+    # Live updates are published from worker threads onto this loop
+    broadcaster.start()
+    # Settle queued results, including any left over from a previous run
+    settlement_worker.start()
     yield
-    # Shutdown: nothing yet
+    # Shutdown: stop the settlement worker and the kickoff listener, flush buffered bets, end open event
+    # streams, release the async pool's connections and the bcrypt workers
+    await settlement_worker.stop()
+    kickoff_index.stop()
+    bet_writer.stop()
+    broadcaster.close()
+    await async_engine.dispose()
+    password_hashing.shutdown()
 
 cors_origins = os.getenv("CORS_ORIGIN", "http://localhost:3000, http://localhost:5173")
 
@@ -35,16 +65,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Location"],
 )
 
+
+@app.exception_handler(password_hashing.PasswordPoolBusy)
+async def password_pool_busy_handler(request: Request, exc: password_hashing.PasswordPoolBusy) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many login attempts in progress, please retry shortly"},
+        headers={"Retry-After": str(password_hashing.PASSWORD_RETRY_AFTER_SECONDS)},
+    )
+
+
+@app.exception_handler(BetWriterBusy)
+async def bet_writer_busy_handler(request: Request, exc: BetWriterBusy) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many bets are being placed, please retry shortly"},
+        headers={"Retry-After": str(BET_WRITE_RETRY_AFTER_SECONDS)},
+    )
+
+
 app.include_router(auth_router, prefix="/api")
 app.include_router(teams_router, prefix="/api")
 app.include_router(matches_router, prefix="/api")
 app.include_router(bets_router, prefix="/api")
 app.include_router(leaderboard_router, prefix="/api")
 app.include_router(stages_router, prefix="/api")
+app.include_router(settlements_router, prefix="/api")
+app.include_router(events_router, prefix="/api")
 
 
 @app.get("/api/health")
 def health() -> dict:
     return {"status": "ok"}
+
+
+@app.get("/api/metrics")
+def get_metrics(current_user: AuthenticatedUser = Depends(get_current_user)) -> dict:
+    """Internal counters, histograms and cache ratios (admin only)"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can read metrics"
+        )
+    
+    data = metrics.snapshot()
+    data["leaderboard_cache_hit_ratio"] = metrics.ratio(
+        "leaderboard_cache_hits", ["leaderboard_cache_hits", "leaderboard_cache_misses"]
+    )
+    return data
@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, List
+
+# Process-level metrics registry. Counters and timing histograms are kept in
+# memory and exposed as JSON through /api/metrics.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_histograms: Dict[str, dict] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float, buckets: tuple = DEFAULT_BUCKETS) -> None:
+    """Record a value (usually seconds) in a cumulative bucket histogram"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = {"buckets": buckets, "counts": [0] * len(buckets), "count": 0, "sum": 0.0, "max": 0.0}
+            _histograms[name] = histogram
+        for index, bound in enumerate(histogram["buckets"]):
+            if value <= bound:
+                histogram["counts"][index] += 1
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["max"] = max(histogram["max"], value)
+
+
+def ratio(numerator: str, denominator: List[str]) -> float:
+    """Ratio of a counter over the sum of other counters (0 when nothing was counted)"""
+    with _lock:
+        total = sum(_counters.get(name, 0) for name in denominator)
+        return _counters.get(numerator, 0) / total if total else 0.0
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": {
+                name: {
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "max": histogram["max"],
+                    "buckets": {str(bound): count for bound, count in zip(histogram["buckets"], histogram["counts"])},
+                }
+                for name, histogram in _histograms.items()
+            },
+        }
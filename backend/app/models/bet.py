@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from sqlmodel import SQLModel, Field, Relationship
 from datetime import datetime
 
@@ -18,3 +18,25 @@ class Bet(SQLModel, table=True):
     # Relationships
     match: "Match" = Relationship(back_populates="bets")
     user: "User" = Relationship(back_populates="bets")
+
+
+class BetPrediction(SQLModel):
+    match_id: int
+    home_score_prediction: int = Field(ge=0)
+    away_score_prediction: int = Field(ge=0)
+
+
+class BetBatchRequest(SQLModel):
+    stage_id: Optional[int] = Field(default=None, description="When set, every match must belong to this stage")
+    bets: List[BetPrediction]
+
+
+class BetBatchResult(SQLModel):
+    match_id: int
+    status: str = Field(description="'saved', 'locked', 'not_found' or 'wrong_stage'")
+    bet: Optional[Bet] = None
+
+
+class BetBatchResponse(SQLModel):
+    results: List[BetBatchResult]
+    saved: int
@@ -1,4 +1,4 @@
-from typing import Optional, List, TYPE_CHECKING
+from typing import Optional, List, Dict, TYPE_CHECKING
 from sqlmodel import SQLModel, Field, Relationship, Column
 from sqlalchemy import Integer, ForeignKey
 from datetime import datetime
@@ -65,3 +65,53 @@ class MatchResponse(MatchBase):
     
     class Config:
         from_attributes = True
+
+
+class TeamSummary(SQLModel):
+    id: int
+    name: str
+    logo_url: Optional[str] = None
+
+
+class StageSummary(SQLModel):
+    id: int
+    name: str
+
+
+class UserBetSummary(SQLModel):
+    id: int
+    home_score_prediction: int
+    away_score_prediction: int
+    points_awarded: int
+
+
+class StageMatchResponse(MatchResponse):
+    home_team: TeamSummary
+    away_team: TeamSummary
+    stage: StageSummary
+    user_bet: Optional[UserBetSummary] = None
+
+
+class MatchScoreResult(SQLModel):
+    match_id: int
+    home_score: int = Field(ge=0)
+    away_score: int = Field(ge=0)
+
+
+class BulkScoresRequest(SQLModel):
+    stage_id: Optional[int] = Field(default=None, description="When set, every match must belong to this stage")
+    results: List[MatchScoreResult]
+
+
+class MatchSettlement(SQLModel):
+    match_id: int
+    status: str = Field(description="'settled', 'corrected' or 'unchanged'")
+    bets_settled: int
+    points_awarded: int
+    score_delta: int
+
+
+class BulkScoresResponse(SQLModel):
+    matches: List[MatchSettlement]
+    users_updated: int
+    timings_ms: Dict[str, float]
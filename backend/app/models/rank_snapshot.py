@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import Integer, ForeignKey
+
+
+class UserRankSnapshot(SQLModel, table=True):
+    """A user's overall standing once a stage and every earlier one were fully settled"""
+    __tablename__ = "user_rank_snapshots"
+
+    stage_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("stages.id", ondelete="CASCADE"), primary_key=True)
+    )
+    user_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    )
+    rank: int
+    score: int
+    correct_results: int
+    lone_wolf_victories: int
+    defeats: int
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
+class RankTrajectoryEntry(SQLModel):
+    stage_id: int
+    stage_name: str
+    stage_date: datetime
+    rank: int
+    score: int
+    # Places gained since the previous snapshotted stage, None for the first one
+    movement: Optional[int] = None
+
+
+class RankMover(SQLModel):
+    id: int
+    username: str
+    rank: int
+    previous_rank: int
+    movement: int
+    score: int
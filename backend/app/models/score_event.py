@@ -0,0 +1,28 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import Integer, ForeignKey
+from datetime import datetime
+
+
+class ScoreEvent(SQLModel, table=True):
+    """Append-only ledger entry: one score change of one user"""
+    __tablename__ = "score_events"
+
+    id: int = Field(default=None, primary_key=True)
+    user_id: int = Field(sa_column=Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False))
+    # Null for adjustments that do not come from a match (e.g. opening balances)
+    match_id: Optional[int] = Field(
+        default=None, sa_column=Column(Integer, ForeignKey("matches.id", ondelete="CASCADE"), nullable=True)
+    )
+    stage_id: Optional[int] = Field(
+        default=None, sa_column=Column(Integer, ForeignKey("stages.id", ondelete="CASCADE"), nullable=True)
+    )
+    delta: int
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
+class StandingEntry(SQLModel):
+    rank: int
+    id: int
+    username: str
+    score: int
@@ -0,0 +1,40 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import Integer, ForeignKey
+from datetime import datetime
+
+
+class SettlementJobBase(SQLModel):
+    match_id: int
+    home_score: int
+    away_score: int
+    previous_home_score: Optional[int] = None
+    previous_away_score: Optional[int] = None
+    status: str = Field(default="pending", description="'pending', 'running', 'done', 'failed' or 'superseded'")
+    attempts: int = Field(default=0)
+    bets_settled: Optional[int] = None
+    users_updated: Optional[int] = None
+    error: Optional[str] = None
+
+
+class SettlementJob(SettlementJobBase, table=True):
+    __tablename__ = "settlement_jobs"
+
+    id: int = Field(default=None, primary_key=True)
+    match_id: int = Field(sa_column=Column(Integer, ForeignKey("matches.id", ondelete="CASCADE"), nullable=False))
+    created_at: datetime = Field(default_factory=datetime.now)
+    # Not claimed before this, so a failed attempt is retried after a delay
+    available_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class SettlementJobResponse(SettlementJobBase):
+    id: int
+    created_at: datetime
+    available_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
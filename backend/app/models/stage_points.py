@@ -0,0 +1,28 @@
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import Integer, ForeignKey
+
+
+class UserStagePoints(SQLModel, table=True):
+    """Per-stage aggregate of a user's bets, maintained during settlement"""
+    __tablename__ = "user_stage_points"
+
+    user_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    )
+    stage_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("stages.id", ondelete="CASCADE"), primary_key=True)
+    )
+    points: int = Field(default=0)
+    exact_hits: int = Field(default=0)
+    lone_wolves: int = Field(default=0)
+    defeats: int = Field(default=0)
+
+
+class StageLeaderboardEntry(SQLModel):
+    rank: int
+    id: int
+    username: str
+    points: int
+    exact_hits: int
+    lone_wolves: int
+    defeats: int
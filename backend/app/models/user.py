@@ -21,3 +21,13 @@ class User(SQLModel, table=True):
     
     # Relationships
     bets: List["Bet"] = Relationship(back_populates="user")
+
+
+class LeaderboardEntry(SQLModel):
+    rank: int
+    id: int
+    username: str
+    score: int
+    correct_results: int
+    lone_wolf_victories: int
+    defeats: int
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlmodel import Session, select
-from app.db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import get_session, get_async_session
 from app.models.user import User
-from app.security import verify_password, create_access_token, hash_password
-from app.dependencies import get_current_user
+from app.security import create_access_token
+from app.services.password_hashing import verify_password_async, hash_password_pooled
+from app.dependencies import get_current_user, AuthenticatedUser
+from app.services.leaderboard_cache import leaderboard_cache
+from app.services.user_cache import user_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -39,9 +43,10 @@ class UpdateUserRequest(BaseModel):
 
 
 @router.post("/login", response_model=LoginResponse)
-def login(payload: LoginRequest, session: Session = Depends(get_session)) -> LoginResponse:
-    user = session.exec(select(User).where(User.username == payload.username)).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: LoginRequest, session: AsyncSession = Depends(get_async_session)) -> LoginResponse:
+    user = (await session.exec(select(User).where(User.username == payload.username))).first()
+    # bcrypt is CPU bound, it runs in the password hashing pool
+    if not user or not await verify_password_async(payload.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token(sub=str(user.id), extra={"username": user.username, "phone": user.phone})
@@ -60,7 +65,7 @@ def login(payload: LoginRequest, session: Session = Depends(get_session)) -> Log
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)) -> UserResponse:
+async def get_current_user_info(current_user: AuthenticatedUser = Depends(get_current_user)) -> UserResponse:
     return UserResponse(
         id=current_user.id,
         username=current_user.username,
@@ -74,34 +79,39 @@ def get_current_user_info(current_user: User = Depends(get_current_user)) -> Use
 @router.put("/me", response_model=UserResponse)
 def update_current_user(
     update_data: UpdateUserRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
     session: Session = Depends(get_session)
 ) -> UserResponse:
+    # current_user belongs to the authentication session, edit this session's copy
+    user = session.get(User, current_user.id)
+    
     # Check if username is being updated and if it's already taken
-    if update_data.username and update_data.username != current_user.username:
+    if update_data.username and update_data.username != user.username:
         existing_user = session.exec(select(User).where(User.username == update_data.username)).first()
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already taken")
-        current_user.username = update_data.username
+        user.username = update_data.username
 
     # Update phone if provided
     if update_data.phone:
-        current_user.phone = update_data.phone
+        user.phone = update_data.phone
 
     # Update password if provided
     if update_data.password:
-        current_user.hashed_password = hash_password(update_data.password)
+        user.hashed_password = hash_password_pooled(update_data.password)
 
     # Save changes to database
-    session.add(current_user)
+    session.add(user)
     session.commit()
-    session.refresh(current_user)
+    session.refresh(user)
+    user_cache.invalidate(user.id)
+    leaderboard_cache.invalidate()
 
     return UserResponse(
-        id=current_user.id,
-        username=current_user.username,
-        phone=current_user.phone,
-        score=current_user.score,
-        is_active=current_user.is_active,
-        is_superuser=current_user.is_superuser
+        id=user.id,
+        username=user.username,
+        phone=user.phone,
+        score=user.score,
+        is_active=user.is_active,
+        is_superuser=user.is_superuser
     )
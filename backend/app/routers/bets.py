@@ -1,48 +1,207 @@
-from fastapi import APIRouter, Depends, HTTPException
+import csv
+import io
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
-from app.db import get_session
-from app.models.bet import Bet
+from app.db import async_engine, get_session, get_async_session
+from app.models.bet import Bet, BetBatchRequest, BetBatchResponse
 from app.models.match import Match
+from app.dependencies import get_current_user, AuthenticatedUser
+from app.services.bet_writer import bet_writer
+from app.services.bets import update_bet_predictions, upsert_bet, upsert_bets
+from app.services.kickoff_index import kickoff_index
 
 router = APIRouter(prefix="/bets", tags=["bets"])
 
+# Rows fetched per round trip from the server-side cursor when exporting
+BETS_EXPORT_BATCH_SIZE = 1000
+
+BET_EXPORT_COLUMNS = (
+    "id",
+    "user_id",
+    "match_id",
+    "home_score_prediction",
+    "away_score_prediction",
+    "points_awarded",
+    "created_at",
+    "updated_at",
+)
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 
 @router.post("/", response_model=Bet)
 def create_bet(bet: Bet, session: Session = Depends(get_session)) -> Bet:
+    """Place a bet, or replace the user's existing bet on the match, before kickoff"""
     # Validate prediction values
     if bet.home_score_prediction < 0 or bet.away_score_prediction < 0:
         raise HTTPException(status_code=400, detail="Predictions must be non-negative numbers")
     
-    # Check if match exists and hasn't started
-    match = session.get(Match, bet.match_id)
-    if not match:
+    # Known kickoffs are checked in memory, so late bets never reach the database
+    now = datetime.now()
+    if kickoff_index.has_started(bet.match_id, now):
+        raise HTTPException(status_code=400, detail="Cannot place bet after match has started")
+    
+    # The kickoff check and the one-bet-per-user-per-match rule are enforced by the statement itself
+    if bet_writer.running:
+        match_found, saved = bet_writer.upsert(
+            bet.user_id, bet.match_id, bet.home_score_prediction, bet.away_score_prediction, now
+        )
+    else:
+        match_found, saved = upsert_bet(
+            session,
+            bet.user_id,
+            bet.match_id,
+            bet.home_score_prediction,
+            bet.away_score_prediction,
+            now,
+        )
+        session.commit()
+    
+    if not match_found:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    if datetime.now() >= match.kickoff_at:
+    if saved is None:
         raise HTTPException(status_code=400, detail="Cannot place bet after match has started")
     
-    # Enforce one bet per user per match
-    existing = session.exec(
-        select(Bet).where(Bet.user_id == bet.user_id, Bet.match_id == bet.match_id)
-    ).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Bet already exists for this user and match")
+    return saved
+
+
+@router.post("/batch", response_model=BetBatchResponse)
+def create_bets_batch(
+    payload: BetBatchRequest,
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> BetBatchResponse:
+    """Place or replace the current user's bets on many matches at once
+
+    Matches that already kicked off are reported as locked and the other bets are still saved.
+    """
+    match_ids = [prediction.match_id for prediction in payload.bets]
+    if len(set(match_ids)) != len(match_ids):
+        raise HTTPException(status_code=400, detail="Each match can only appear once")
     
-    session.add(bet)
-    session.commit()
-    session.refresh(bet)
-    return bet
+    # Known kickoffs are checked in memory and only the open bets are sent to the database
+    now = datetime.now()
+    locked = set()
+    for prediction in payload.bets:
+        entry = kickoff_index.get(prediction.match_id)
+        # Out-of-stage matches go to the database so they are reported as such
+        if entry is not None and now >= entry[0] and payload.stage_id in (None, entry[1]):
+            locked.add(prediction.match_id)
+    open_bets = [prediction for prediction in payload.bets if prediction.match_id not in locked]
+    written = {
+        result["match_id"]: result
+        for result in upsert_bets(session, current_user.id, open_bets, now, stage_id=payload.stage_id)
+    }
+    if written:
+        session.commit()
+    
+    results = [
+        written.get(match_id) or {"match_id": match_id, "status": "locked", "bet": None}
+        for match_id in match_ids
+    ]
+    return BetBatchResponse(
+        results=results,
+        saved=sum(1 for result in results if result["status"] == "saved"),
+    )
 
 
 @router.get("/", response_model=list[Bet])
-def list_bets(session: Session = Depends(get_session)) -> list[Bet]:
-    return session.exec(select(Bet)).all()
+async def list_bets(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit for every bet"),
+    after_id: Optional[int] = Query(None, description="Return bets after this id, from X-Next-Cursor"),
+    session: AsyncSession = Depends(get_async_session)
+) -> list[Bet]:
+    statement = select(Bet).order_by(Bet.id)
+    if after_id is not None:
+        statement = statement.where(Bet.id > after_id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    
+    bets = (await session.exec(statement)).all()
+    if limit is not None and len(bets) == limit:
+        response.headers["X-Next-Cursor"] = str(bets[-1].id)
+    return bets
+
+
+def _bets_export_statement(
+    stage_id: Optional[int],
+    match_id: Optional[int],
+    user_id: Optional[int],
+    updated_from: Optional[datetime],
+    updated_to: Optional[datetime],
+):
+    statement = select(*(getattr(Bet, column) for column in BET_EXPORT_COLUMNS)).order_by(Bet.id)
+    if stage_id is not None:
+        statement = statement.join(Match, Match.id == Bet.match_id).where(Match.stage_id == stage_id)
+    if match_id is not None:
+        statement = statement.where(Bet.match_id == match_id)
+    if user_id is not None:
+        statement = statement.where(Bet.user_id == user_id)
+    if updated_from is not None:
+        statement = statement.where(Bet.updated_at >= updated_from)
+    if updated_to is not None:
+        statement = statement.where(Bet.updated_at < updated_to)
+    return statement
+
+
+def _ndjson_chunk(partition) -> str:
+    return "".join(
+        json.dumps(dict(zip(BET_EXPORT_COLUMNS, row)), default=lambda value: value.isoformat()) + "\n"
+        for row in partition
+    )
+
+
+def _csv_chunk(partition) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in partition
+    )
+    return buffer.getvalue()
+
+
+async def _stream_bets_export(statement, export_format: str):
+    """Yield the exported bets one cursor batch at a time, so memory stays bounded"""
+    # The request session is closed once the response starts, so the stream owns its own
+    async with AsyncSession(async_engine) as session:
+        if export_format == "csv":
+            yield ",".join(BET_EXPORT_COLUMNS) + "\r\n"
+        result = await session.stream(statement.execution_options(yield_per=BETS_EXPORT_BATCH_SIZE))
+        format_chunk = _csv_chunk if export_format == "csv" else _ndjson_chunk
+        async for partition in result.partitions():
+            yield format_chunk(partition)
+
+
+@router.get("/export")
+async def export_bets(
+    export_format: str = Query("ndjson", alias="format", description="'ndjson' or 'csv'"),
+    stage_id: Optional[int] = Query(None),
+    match_id: Optional[int] = Query(None),
+    user_id: Optional[int] = Query(None),
+    updated_from: Optional[datetime] = Query(None, description="Only bets updated at or after this moment"),
+    updated_to: Optional[datetime] = Query(None, description="Only bets updated before this moment"),
+) -> StreamingResponse:
+    """Stream every bet matching the filters as NDJSON or CSV, ordered by id"""
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be 'ndjson' or 'csv'")
+    
+    statement = _bets_export_statement(stage_id, match_id, user_id, updated_from, updated_to)
+    return StreamingResponse(
+        _stream_bets_export(statement, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="bets.{export_format}"'},
+    )
 
 
 @router.get("/{bet_id}", response_model=Bet)
-def get_bet(bet_id: int, session: Session = Depends(get_session)) -> Bet:
-    bet = session.get(Bet, bet_id)
+async def get_bet(bet_id: int, session: AsyncSession = Depends(get_async_session)) -> Bet:
+    bet = await session.get(Bet, bet_id)
     if not bet:
         raise HTTPException(status_code=404, detail="Bet not found")
     return bet
@@ -50,33 +209,35 @@ def get_bet(bet_id: int, session: Session = Depends(get_session)) -> Bet:
 
 @router.patch("/{bet_id}", response_model=Bet)
 def update_bet(bet_id: int, bet_update: Bet, session: Session = Depends(get_session)) -> Bet:
-    bet = session.get(Bet, bet_id)
-    if not bet:
-        raise HTTPException(status_code=404, detail="Bet not found")
-    
     # Validate prediction values
     if bet_update.home_score_prediction < 0 or bet_update.away_score_prediction < 0:
         raise HTTPException(status_code=400, detail="Predictions must be non-negative numbers")
     
-    # Check if match exists and hasn't started
-    match = session.get(Match, bet.match_id)
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
+    # Only allow updating predictions for now, and only before kickoff
+    if bet_writer.running:
+        bet_found, bet = bet_writer.update(
+            bet_id, bet_update.home_score_prediction, bet_update.away_score_prediction, datetime.now()
+        )
+    else:
+        bet_found, bet = update_bet_predictions(
+            session,
+            bet_id,
+            bet_update.home_score_prediction,
+            bet_update.away_score_prediction,
+            datetime.now(),
+        )
+        session.commit()
+    
+    if not bet_found:
+        raise HTTPException(status_code=404, detail="Bet not found")
     
-    if datetime.now() >= match.kickoff_at:
+    if bet is None:
         raise HTTPException(status_code=400, detail="Cannot update bet after match has started")
     
-    # Only allow updating predictions for now
-    bet.home_score_prediction = bet_update.home_score_prediction
-    bet.away_score_prediction = bet_update.away_score_prediction
-    bet.updated_at = datetime.now()
-    session.add(bet)
-    session.commit()
-    session.refresh(bet)
     return bet
 
 
 @router.get("/user/{user_id}", response_model=list[Bet])
-def list_user_bets(user_id: int, session: Session = Depends(get_session)) -> list[Bet]:
-    bets = session.exec(select(Bet).where(Bet.user_id == user_id)).all()
+async def list_user_bets(user_id: int, session: AsyncSession = Depends(get_async_session)) -> list[Bet]:
+    bets = (await session.exec(select(Bet).where(Bet.user_id == user_id))).all()
     return bets
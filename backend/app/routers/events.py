@@ -0,0 +1,48 @@
+import asyncio
+import os
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.dependencies import get_stream_user, AuthenticatedUser
+from app.services.broadcaster import broadcaster
+
+# A comment line is sent when idle so proxies keep the connection open
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+async def _event_stream(request: Request, queue: asyncio.Queue):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            # None means the subscriber was dropped or the server is shutting down
+            if frame is None:
+                return
+            yield frame
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+@router.get("")
+@router.get("/")
+async def stream_events(
+    request: Request,
+    current_user: AuthenticatedUser = Depends(get_stream_user)
+) -> StreamingResponse:
+    """Stream match results and the resulting standings changes as server-sent events
+
+    EventSource cannot send headers, so the token is passed as the token query parameter.
+    """
+    queue = broadcaster.subscribe()
+    return StreamingResponse(
+        _event_stream(request, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
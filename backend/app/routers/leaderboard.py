@@ -1,39 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from app.db import get_session
-from app.models.user import User
-from app.dependencies import get_current_user
+import json
+import time
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app import metrics
+from app.db import get_session, get_async_session
+from app.models.user import LeaderboardEntry
+from app.models.score_event import StandingEntry
+from app.models.rank_snapshot import RankTrajectoryEntry
+from app.dependencies import get_current_user, AuthenticatedUser
 from app.services.tie_breaking import update_all_users_tie_breaking_stats
+from app.services.leaderboard_cache import leaderboard_cache, etag_matches
+from app.services.reconciliation import SettlementInProgress, reconcile
+from app.services.rank_snapshots import get_rank_trajectory
+from app.services.ledger import get_standings_as_of_stage, get_standings_as_of_time, rebuild_scores_from_ledger
+from app.services.settlement import invalidate_score_caches
+from app.services.leaderboard import (
+    decode_cursor,
+    encode_cursor,
+    get_full_leaderboard,
+    get_leaderboard_around,
+    get_leaderboard_page,
+)
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
 
 @router.get("")
-@router.get("/", response_model=list[User])
-def get_leaderboard(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
-) -> list[User]:
+@router.get("/", response_model=list[LeaderboardEntry])
+async def get_leaderboard(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size; omit for the whole leaderboard"),
+    cursor: Optional[str] = Query(None, description="Cursor returned in X-Next-Cursor by the previous page"),
+    around_me: bool = Query(False, description="Return a page centered on the current user"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> Response:
     """Get all users ordered by score with tie-breaking rules:
     1. More correct results
     2. More lone wolf victories  
     3. Fewer defeats
+
+    Users tied on every rule share a rank. Without paging parameters the whole
+    leaderboard is served from a per-process cache with a strong ETag, so
+    unchanged polls get a 304. With `limit` the leaderboard is read page by
+    page (keyset pagination) and the next page's cursor is sent in the
+    X-Next-Cursor header.
     """
-    users = session.exec(
-        select(User).order_by(
-            User.score.desc(),
-            User.correct_results.desc(),
-            User.lone_wolf_victories.desc(),
-            User.defeats.asc()
-        )
-    ).all()
-    return users
+    if limit is not None or cursor is not None or around_me:
+        return await _get_leaderboard_page(session, current_user, limit or 50, cursor, around_me)
+
+    cached = leaderboard_cache.get()
+    if cached is None:
+        version = leaderboard_cache.version
+        started = time.perf_counter()
+        entries = await get_full_leaderboard(session)
+        body = json.dumps(jsonable_encoder(entries)).encode("utf-8")
+        cached = leaderboard_cache.store(version, body)
+        metrics.observe("leaderboard_rebuild_seconds", time.perf_counter() - started)
+
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+async def _get_leaderboard_page(
+    session: AsyncSession,
+    current_user: AuthenticatedUser,
+    limit: int,
+    cursor: Optional[str],
+    around_me: bool,
+) -> Response:
+    if around_me:
+        entries = await get_leaderboard_around(session, current_user.id, limit)
+    else:
+        try:
+            key = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        entries = await get_leaderboard_page(session, limit, cursor=key)
+
+    headers = {}
+    if len(entries) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(entries[-1])
+    body = json.dumps(jsonable_encoder(entries)).encode("utf-8")
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("/update-stats")
 def update_tie_breaking_stats(
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> dict:
     """Update tie-breaking statistics for all users (Admin only)"""
     # Check if user is admin
@@ -41,4 +102,65 @@ def update_tie_breaking_stats(
         raise HTTPException(status_code=403, detail="Admin access required")
     
     update_all_users_tie_breaking_stats(session)
+    leaderboard_cache.invalidate()
     return {"message": "Tie-breaking statistics updated successfully"}
+
+
+@router.get("/standings", response_model=List[StandingEntry])
+async def get_standings(
+    stage_id: Optional[int] = Query(None, description="Standings once this stage and all earlier ones were played"),
+    as_of: Optional[datetime] = Query(None, description="Standings at this moment"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> List[StandingEntry]:
+    """Get point-in-time standings from the score ledger"""
+    if (stage_id is None) == (as_of is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of stage_id or as_of")
+    if stage_id is not None:
+        return await get_standings_as_of_stage(session, stage_id)
+    return await get_standings_as_of_time(session, as_of)
+
+
+@router.get("/users/{user_id}/ranks", response_model=List[RankTrajectoryEntry])
+async def get_user_rank_trajectory(
+    user_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> List[RankTrajectoryEntry]:
+    """Get a user's overall rank after every fully settled stage"""
+    return await get_rank_trajectory(session, user_id)
+
+
+@router.post("/rebuild-scores")
+def rebuild_scores(
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> dict:
+    """Rebuild every user's score from the score ledger (Admin only)"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    users_fixed = rebuild_scores_from_ledger(session)
+    session.commit()
+    if users_fixed:
+        invalidate_score_caches()
+    return {"message": "Scores rebuilt from the score ledger", "users_fixed": users_fixed}
+
+
+@router.post("/reconcile")
+def reconcile_scores(
+    repair: bool = Query(False, description="Write the recomputed values back"),
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> dict:
+    """Recompute bet points, scores and tie-breaking stats from scratch and report differences (Admin only)"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        report = reconcile(session, repair=repair)
+    except SettlementInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if report["repaired"]:
+        invalidate_score_caches()
+    return report
@@ -1,76 +1,52 @@
+import time
 from datetime import datetime, date, timedelta
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlmodel import Session, select
-from app.db import get_session
-from app.models.match import Match, MatchCreate, MatchUpdate, MatchResponse
-from app.models.bet import Bet
-from app.models.user import User
-from app.dependencies import get_current_user
-from app.services.tie_breaking import update_all_users_tie_breaking_stats
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import get_session, get_async_session
+from app.models.match import (
+    Match,
+    MatchCreate,
+    MatchUpdate,
+    MatchResponse,
+    BulkScoresRequest,
+    BulkScoresResponse,
+)
+from app.dependencies import get_current_user, AuthenticatedUser
+from app.services.kickoff_index import kickoff_index, notify_schedule_change
+from app.services.live_updates import publish_score_update
+from app.services.settlement import settle_matchday, invalidate_score_caches
+from app.services.settlement_worker import enqueue_settlement, has_unfinished_jobs, settlement_worker
 
 router = APIRouter(prefix="/matches", tags=["matches"])
 
 
-def calculate_bet_points(home_prediction: int, away_prediction: int, home_actual: int, away_actual: int) -> int:
-    """
-    Calculate points awarded for a bet based on the prediction vs actual result.
-    
-    Scoring system:
-    - Exact score match: 3 points
-    - Correct result (win/draw/loss): 1 point
-    - Wrong result: 0 points
-    """
-    # Exact score match
-    if home_prediction == home_actual and away_prediction == away_actual:
-        return 3
-    
-    # Determine predicted result
-    if home_prediction > away_prediction:
-        predicted_result = "home_win"
-    elif home_prediction < away_prediction:
-        predicted_result = "away_win"
-    else:
-        predicted_result = "draw"
-    
-    # Determine actual result
-    if home_actual > away_actual:
-        actual_result = "home_win"
-    elif home_actual < away_actual:
-        actual_result = "away_win"
-    else:
-        actual_result = "draw"
-    
-    # Correct result (but not exact score)
-    if predicted_result == actual_result:
-        return 1
-    
-    # Wrong result
-    return 0
-
-
 @router.post("/", response_model=MatchResponse)
 def create_match(
     match_data: MatchCreate, 
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> MatchResponse:
     """Create a new match"""
     match = Match(**match_data.dict())
     session.add(match)
+    session.flush()
+    notify_schedule_change(session, match.id)
     session.commit()
     session.refresh(match)
+    kickoff_index.put(match.id, match.kickoff_at, match.stage_id)
     return match
 
 
 @router.get("/{match_id}", response_model=MatchResponse)
-def get_match(
+async def get_match(
     match_id: int, 
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> MatchResponse:
     """Get a specific match by ID"""
-    match = session.get(Match, match_id)
+    match = await session.get(Match, match_id)
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     return match
@@ -80,17 +56,23 @@ def get_match(
 def update_match_scores(
     match_id: int,
     scores: dict,
+    response: Response,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> MatchResponse:
-    """Update match scores and process bet calculations (admin only)"""
+    """Update match scores and queue the bet calculations (admin only)
+
+    The result is stored right away and its bets are settled by the background
+    worker. A new settlement answers 202 with the job in the Location header.
+    """
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only administrators can update match scores"
         )
     
-    match = session.get(Match, match_id)
+    # Locked, so overlapping submissions read each other's result as the previous one
+    match = session.get(Match, match_id, with_for_update=True)
     if not match:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -119,75 +101,92 @@ def update_match_scores(
             detail="Scores must be non-negative"
         )
     
-    # Check if this is the first time scores are being set
-    is_first_time_scoring = match.home_score is None and match.away_score is None
-    
-    # Check if scores are being changed (not first time)
-    is_score_update = not is_first_time_scoring and (match.home_score != home_score or match.away_score != away_score)
-    
-    # Update match scores
-    match.home_score = home_score
-    match.away_score = away_score
-    match.updated_at = datetime.now()
-    
-    # Process bets if this is first time scoring OR if scores are being updated
-    if is_first_time_scoring or is_score_update:
-        # Get all bets for this match
-        bets_stmt = select(Bet).where(Bet.match_id == match_id)
-        bets = session.exec(bets_stmt).all()
-        
-        # Track user score updates
-        user_score_updates = {}
-        
-        for bet in bets:
-            # Calculate points for this bet
-            points_awarded = calculate_bet_points(
-                bet.home_score_prediction,
-                bet.away_score_prediction,
-                home_score,
-                away_score
-            )
-            
-            # If this is a score update, subtract the old points first
-            if is_score_update:
-                old_points = bet.points_awarded
-                if bet.user_id not in user_score_updates:
-                    user_score_updates[bet.user_id] = 0
-                user_score_updates[bet.user_id] -= old_points
-            
-            # Update bet points
-            bet.points_awarded = points_awarded
-            bet.updated_at = datetime.now()
-            
-            # Track user score update
-            if bet.user_id not in user_score_updates:
-                user_score_updates[bet.user_id] = 0
-            user_score_updates[bet.user_id] += points_awarded
-        
-        # Update user scores
-        for user_id, points_to_add in user_score_updates.items():
-            user = session.get(User, user_id)
-            if user:
-                user.score += points_to_add
-                user.updated_at = datetime.now()
-                session.add(user)
-        
-        # Update tie-breaking statistics for all users after processing bets
-        update_all_users_tie_breaking_stats(session)
-    
-    session.add(match)
+    job = enqueue_settlement(session, match, home_score, away_score)
     session.commit()
     session.refresh(match)
     
+    if job is not None:
+        settlement_worker.notify()
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Location"] = f"/api/settlements/{job.id}"
+    
     return match
 
 
+@router.post("/scores/bulk", response_model=BulkScoresResponse)
+def update_matchday_scores(
+    payload: BulkScoresRequest,
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> BulkScoresResponse:
+    """Update the scores of many matches and settle all their bets in one transaction (admin only)"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can update match scores"
+        )
+    
+    started = time.perf_counter()
+    match_ids = [result.match_id for result in payload.results]
+    if len(set(match_ids)) != len(match_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Each match can only appear once"
+        )
+    
+    # Locked in id order, so overlapping submissions settle one after the other without deadlocking
+    matches = {
+        match.id: match
+        for match in session.exec(
+            select(Match).where(Match.id.in_(match_ids)).order_by(Match.id).with_for_update()
+        ).all()
+    }
+    missing = [match_id for match_id in match_ids if match_id not in matches]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Matches not found: {missing}"
+        )
+    
+    if has_unfinished_jobs(session, match_ids):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Some of these matches still have a settlement in progress or a failed one to repair"
+        )
+    
+    if payload.stage_id is not None:
+        outside = [match_id for match_id in match_ids if matches[match_id].stage_id != payload.stage_id]
+        if outside:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Matches not in stage {payload.stage_id}: {outside}"
+            )
+    
+    summary = settle_matchday(
+        session,
+        [(matches[result.match_id], result.home_score, result.away_score) for result in payload.results],
+    )
+    
+    committing = time.perf_counter()
+    session.commit()
+    finished = time.perf_counter()
+    
+    changed = [match["match_id"] for match in summary["matches"] if match["status"] != "unchanged"]
+    if changed:
+        invalidate_score_caches()
+        publish_score_update(changed)
+    
+    summary["timings_ms"]["commit"] = round((finished - committing) * 1000, 3)
+    summary["timings_ms"]["total"] = round((finished - started) * 1000, 3)
+    return BulkScoresResponse(**summary)
+
+
 @router.put("/{match_id}", response_model=MatchResponse)
 def update_match(
     match_id: int,
     match_data: MatchUpdate,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> MatchResponse:
     """Update a match"""
     match = session.get(Match, match_id)
@@ -200,20 +199,22 @@ def update_match(
     
     match.updated_at = match.updated_at  # This will be updated by the database trigger or manually
     session.add(match)
+    notify_schedule_change(session, match.id)
     session.commit()
     session.refresh(match)
+    kickoff_index.put(match.id, match.kickoff_at, match.stage_id)
     return match
 
 
 @router.get("/", response_model=List[MatchResponse])
-def list_matches_by_day(
+async def list_matches_by_day(
     date_str: str = Query(None, alias="date", description="YYYY-MM-DD"),
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> List[MatchResponse]:
     """Get matches, optionally filtered by date"""
     if not date_str:
-        return session.exec(select(Match)).all()
+        return (await session.exec(select(Match))).all()
     try:
         d = datetime.strptime(date_str, "%Y-%m-%d").date()
     except ValueError:
@@ -221,4 +222,4 @@ def list_matches_by_day(
     start = datetime.combine(d, datetime.min.time())
     end = start + timedelta(days=1)
     stmt = select(Match).where(Match.kickoff_at >= start, Match.kickoff_at < end)
-    return session.exec(stmt).all()
+    return (await session.exec(stmt)).all()
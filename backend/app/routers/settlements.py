@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import get_async_session
+from app.models.settlement import SettlementJob, SettlementJobResponse
+from app.dependencies import get_current_user, AuthenticatedUser
+
+router = APIRouter(prefix="/settlements", tags=["settlements"])
+
+
+@router.get("/{job_id}", response_model=SettlementJobResponse)
+async def get_settlement_job(
+    job_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> SettlementJobResponse:
+    """Get the progress of a background match settlement"""
+    job = await session.get(SettlementJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Settlement job not found"
+        )
+    return job
@@ -1,11 +1,21 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import and_
+from sqlalchemy.orm import aliased
 from sqlmodel import Session, select
-from ..db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import async_engine, get_session, get_async_session
 from ..models.stage import Stage, StageCreate, StageUpdate, StageResponse
-from ..models.match import Match
+from ..models.match import Match, StageMatchResponse, TeamSummary, StageSummary, UserBetSummary
+from ..models.team import Team
 from ..models.bet import Bet
-from ..dependencies import get_current_user
+from ..models.stage_points import StageLeaderboardEntry
+from ..models.rank_snapshot import RankMover
+from ..services import rank_snapshots, stage_points
+from ..dependencies import get_current_user, AuthenticatedUser
 from ..models.user import User
 
 router = APIRouter(prefix="/stages", tags=["stages"])
@@ -15,7 +25,7 @@ router = APIRouter(prefix="/stages", tags=["stages"])
 def create_stage(
     stage_data: StageCreate,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """Create a new stage"""
     stage = Stage(**stage_data.dict())
@@ -27,24 +37,24 @@ def create_stage(
 
 @router.get("", response_model=List[StageResponse])
 @router.get("/", response_model=List[StageResponse])
-def get_stages(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+async def get_stages(
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """Get all stages"""
     statement = select(Stage).order_by(Stage.date)
-    stages = session.exec(statement).all()
+    stages = (await session.exec(statement)).all()
     return stages
 
 
 @router.get("/{stage_id}", response_model=StageResponse)
-def get_stage(
+async def get_stage(
     stage_id: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """Get a specific stage by ID"""
-    stage = session.get(Stage, stage_id)
+    stage = await session.get(Stage, stage_id)
     if not stage:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,7 +68,7 @@ def update_stage(
     stage_id: int,
     stage_data: StageUpdate,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """Update a stage"""
     stage = session.get(Stage, stage_id)
@@ -83,7 +93,7 @@ def update_stage(
 def delete_stage(
     stage_id: int,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """Delete a stage (only if no matches are associated)"""
     stage = session.get(Stage, stage_id)
@@ -107,131 +117,275 @@ def delete_stage(
     return {"message": "Stage deleted successfully"}
 
 
-@router.get("/{stage_id}/matches")
-@router.get("/{stage_id}/matches/")
-def get_stage_matches(
+@router.get("/{stage_id}/matches", response_model=List[StageMatchResponse])
+@router.get("/{stage_id}/matches/", response_model=List[StageMatchResponse])
+async def get_stage_matches(
     stage_id: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
-):
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> List[StageMatchResponse]:
     """Get all matches for a specific stage with user's bets"""
-    stage = session.get(Stage, stage_id)
-    if not stage:
+    # Matches, both teams, the stage and the user's bet come back in one query
+    home_team = aliased(Team)
+    away_team = aliased(Team)
+    statement = (
+        select(Match, home_team, away_team, Stage, Bet)
+        .join(home_team, Match.home_team_id == home_team.id)
+        .join(away_team, Match.away_team_id == away_team.id)
+        .join(Stage, Match.stage_id == Stage.id)
+        .outerjoin(Bet, and_(Bet.match_id == Match.id, Bet.user_id == current_user.id))
+        .where(Match.stage_id == stage_id)
+        .order_by(Match.kickoff_at)
+    )
+    rows = (await session.exec(statement)).all()
+    
+    # Only an empty stage needs a second query to tell it apart from a missing one
+    if not rows and not await session.get(Stage, stage_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Stage not found"
         )
     
-    statement = select(Match).where(Match.stage_id == stage_id).order_by(Match.kickoff_at)
-    matches = session.exec(statement).all()
-    
-    # Return matches with their related data and user's bet if exists
-    result = []
-    for match in matches:
-        # Get user's bet for this match
-        bet_statement = select(Bet).where(
-            Bet.match_id == match.id,
-            Bet.user_id == current_user.id
+    return [
+        StageMatchResponse(
+            id=match.id,
+            home_team_id=match.home_team_id,
+            away_team_id=match.away_team_id,
+            stage_id=match.stage_id,
+            kickoff_at=match.kickoff_at,
+            place=match.place,
+            home_score=match.home_score,
+            away_score=match.away_score,
+            created_at=match.created_at,
+            updated_at=match.updated_at,
+            home_team=TeamSummary(id=home.id, name=home.name, logo_url=home.logo_url),
+            away_team=TeamSummary(id=away.id, name=away.name, logo_url=away.logo_url),
+            stage=StageSummary(id=stage.id, name=stage.name),
+            user_bet=UserBetSummary(
+                id=user_bet.id,
+                home_score_prediction=user_bet.home_score_prediction,
+                away_score_prediction=user_bet.away_score_prediction,
+                points_awarded=user_bet.points_awarded,
+            ) if user_bet else None,
         )
-        user_bet = session.exec(bet_statement).first()
-        
-        match_data = {
+        for match, home, away, stage, user_bet in rows
+    ]
+
+
+# Rows fetched per round trip from the server-side cursor when streaming
+STAGE_BETS_BATCH_SIZE = 500
+
+# Accept header value selecting the compact users x matches grid
+COMPACT_STAGE_BETS_MEDIA_TYPE = "application/vnd.espocity.compact+json"
+# Every form of the stage bets depends on Accept, so caches must key on it
+VARY_ACCEPT = {"Vary": "Accept"}
+
+
+def _stage_bets_statement(stage_id: int):
+    """Bets of a stage joined to their user, match, teams and stage"""
+    home_team = aliased(Team)
+    away_team = aliased(Team)
+    return (
+        select(Bet, User, Match, home_team, away_team, Stage)
+        .join(User, Bet.user_id == User.id)
+        .join(Match, Bet.match_id == Match.id)
+        .join(home_team, Match.home_team_id == home_team.id)
+        .join(away_team, Match.away_team_id == away_team.id)
+        .join(Stage, Match.stage_id == Stage.id)
+        .where(Match.stage_id == stage_id)
+        .order_by(Bet.match_id, Bet.user_id)
+    )
+
+
+def _stage_bet_data(bet: Bet, user: User, match: Match, home: Team, away: Team, stage: Stage) -> dict:
+    return {
+        "id": bet.id,
+        "user": {
+            "id": user.id,
+            "username": user.username,
+        },
+        "match": {
             "id": match.id,
-            "home_team_id": match.home_team_id,
-            "away_team_id": match.away_team_id,
-            "stage_id": match.stage_id,
-            "kickoff_at": match.kickoff_at,
-            "place": match.place,
-            "home_score": match.home_score,
-            "away_score": match.away_score,
-            "created_at": match.created_at,
-            "updated_at": match.updated_at,
             "home_team": {
-                "id": match.home_team.id,
-                "name": match.home_team.name,
-                "logo_url": match.home_team.logo_url,
+                "id": home.id,
+                "name": home.name,
+                "logo_url": home.logo_url,
             },
             "away_team": {
-                "id": match.away_team.id,
-                "name": match.away_team.name,
-                "logo_url": match.away_team.logo_url,
+                "id": away.id,
+                "name": away.name,
+                "logo_url": away.logo_url,
             },
+            "kickoff_at": match.kickoff_at,
+            "home_score": match.home_score,
+            "away_score": match.away_score,
             "stage": {
-                "id": match.stage.id,
-                "name": match.stage.name,
+                "id": stage.id,
+                "name": stage.name,
             },
-            "user_bet": {
-                "id": user_bet.id,
-                "home_score_prediction": user_bet.home_score_prediction,
-                "away_score_prediction": user_bet.away_score_prediction,
-                "points_awarded": user_bet.points_awarded,
-            } if user_bet else None
+        },
+        "home_score_prediction": bet.home_score_prediction,
+        "away_score_prediction": bet.away_score_prediction,
+        "points_awarded": bet.points_awarded,
+    }
+
+
+async def _compact_stage_bets(session: AsyncSession, stage: Stage) -> dict:
+    """
+    Stage bets as a users x matches grid.
+
+    Teams, matches and users are sent once in dictionaries; each grid cell is
+    [home_prediction, away_prediction, points] (or null when the user did not
+    bet), indexed by the positions in user_ids and match_ids.
+    """
+    home_team = aliased(Team)
+    away_team = aliased(Team)
+    match_rows = (await session.exec(
+        select(Match, home_team, away_team)
+        .join(home_team, Match.home_team_id == home_team.id)
+        .join(away_team, Match.away_team_id == away_team.id)
+        .where(Match.stage_id == stage.id)
+        .order_by(Match.kickoff_at, Match.id)
+    )).all()
+    bet_rows = (await session.exec(
+        select(
+            Bet.user_id,
+            User.username,
+            Bet.match_id,
+            Bet.home_score_prediction,
+            Bet.away_score_prediction,
+            Bet.points_awarded,
+        )
+        .join(User, Bet.user_id == User.id)
+        .join(Match, Bet.match_id == Match.id)
+        .where(Match.stage_id == stage.id)
+        .order_by(Bet.user_id)
+    )).all()
+    return _compact_grid(stage, match_rows, bet_rows)
+
+
+def _compact_grid(stage: Stage, match_rows, bet_rows) -> dict:
+    """Build the compact form from (match, home, away) rows and bet rows ordered by user"""
+    teams = {}
+    matches = {}
+    match_ids = []
+    for match, home, away in match_rows:
+        teams[home.id] = {"name": home.name, "logo_url": home.logo_url}
+        teams[away.id] = {"name": away.name, "logo_url": away.logo_url}
+        matches[match.id] = {
+            "home_team_id": match.home_team_id,
+            "away_team_id": match.away_team_id,
+            "kickoff_at": match.kickoff_at,
+            "home_score": match.home_score,
+            "away_score": match.away_score,
         }
-        result.append(match_data)
+        match_ids.append(match.id)
+    match_positions = {match_id: position for position, match_id in enumerate(match_ids)}
+    
+    users = {}
+    user_ids = []
+    grid = []
+    for user_id, username, match_id, home_prediction, away_prediction, points in bet_rows:
+        if user_id not in users:
+            users[user_id] = {"username": username}
+            user_ids.append(user_id)
+            grid.append([None] * len(match_ids))
+        grid[-1][match_positions[match_id]] = [home_prediction, away_prediction, points]
     
-    return result
+    return {
+        "stage": {"id": stage.id, "name": stage.name},
+        "teams": teams,
+        "matches": matches,
+        "users": users,
+        "match_ids": match_ids,
+        "user_ids": user_ids,
+        "grid": grid,
+    }
+
+
+async def _stream_stage_bets(stage_id: int):
+    """Yield the stage bets as a JSON array, one cursor batch at a time"""
+    # The request session is closed once the response starts, so the stream owns its own
+    async with AsyncSession(async_engine) as session:
+        statement = _stage_bets_statement(stage_id).execution_options(yield_per=STAGE_BETS_BATCH_SIZE)
+        result = await session.stream(statement)
+        yield b"["
+        separator = b""
+        async for partition in result.partitions():
+            chunk = ",".join(json.dumps(jsonable_encoder(_stage_bet_data(*row))) for row in partition)
+            yield separator + chunk.encode("utf-8")
+            separator = b","
+            # Keep the identity map from growing with the stream
+            session.expunge_all()
+        yield b"]"
 
 
 @router.get("/{stage_id}/bets")
 @router.get("/{stage_id}/bets/")
-def get_stage_bets(
+async def get_stage_bets(
     stage_id: int,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    stream: bool = Query(False, description="Stream the bets from a server-side cursor"),
+    response_format: Optional[str] = Query(None, alias="format", description="'compact' for the users x matches grid"),
+    accept: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """Get all bets for matches in a specific stage"""
-    stage = session.get(Stage, stage_id)
+    stage = await session.get(Stage, stage_id)
     if not stage:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Stage not found"
         )
     
-    # Get all matches for this stage
-    statement = select(Match).where(Match.stage_id == stage_id)
-    matches = session.exec(statement).all()
+    if response_format == "compact" or (accept and COMPACT_STAGE_BETS_MEDIA_TYPE in accept):
+        return JSONResponse(
+            jsonable_encoder(await _compact_stage_bets(session, stage)),
+            headers=VARY_ACCEPT,
+        )
     
-    if not matches:
-        return []
+    if stream:
+        return StreamingResponse(_stream_stage_bets(stage_id), media_type="application/json", headers=VARY_ACCEPT)
     
-    # Get all bets for these matches
-    match_ids = [match.id for match in matches]
-    bet_statement = select(Bet).where(Bet.match_id.in_(match_ids)).order_by(Bet.match_id, Bet.user_id)
-    bets = session.exec(bet_statement).all()
+    rows = (await session.exec(_stage_bets_statement(stage_id))).all()
+    response.headers.update(VARY_ACCEPT)
+    return [_stage_bet_data(*row) for row in rows]
+
+
+@router.get("/{stage_id}/leaderboard", response_model=List[StageLeaderboardEntry])
+@router.get("/{stage_id}/leaderboard/", response_model=List[StageLeaderboardEntry])
+async def get_stage_leaderboard(
+    stage_id: int,
+    limit: int = Query(100, ge=1, le=500, description="Number of users to return"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """Get the standings of a single stage, ranked by the points earned in it"""
+    stage = await session.get(Stage, stage_id)
+    if not stage:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stage not found"
+        )
     
-    # Build response with user and match details
-    result = []
-    for bet in bets:
-        bet_data = {
-            "id": bet.id,
-            "user": {
-                "id": bet.user.id,
-                "username": bet.user.username,
-            },
-            "match": {
-                "id": bet.match.id,
-                "home_team": {
-                    "id": bet.match.home_team.id,
-                    "name": bet.match.home_team.name,
-                    "logo_url": bet.match.home_team.logo_url,
-                },
-                "away_team": {
-                    "id": bet.match.away_team.id,
-                    "name": bet.match.away_team.name,
-                    "logo_url": bet.match.away_team.logo_url,
-                },
-                "kickoff_at": bet.match.kickoff_at,
-                "home_score": bet.match.home_score,
-                "away_score": bet.match.away_score,
-                "stage": {
-                    "id": bet.match.stage.id,
-                    "name": bet.match.stage.name,
-                },
-            },
-            "home_score_prediction": bet.home_score_prediction,
-            "away_score_prediction": bet.away_score_prediction,
-            "points_awarded": bet.points_awarded,
-        }
-        result.append(bet_data)
+    return await stage_points.get_stage_leaderboard(session, stage_id, limit)
+
+
+@router.get("/{stage_id}/movers", response_model=List[RankMover])
+@router.get("/{stage_id}/movers/", response_model=List[RankMover])
+async def get_stage_movers(
+    stage_id: int,
+    limit: int = Query(10, ge=1, le=100, description="Number of users to return"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """Get the users whose overall rank changed the most with this stage"""
+    stage = await session.get(Stage, stage_id)
+    if not stage:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Stage not found"
+        )
     
-    return result
+    return await rank_snapshots.get_stage_movers(session, stage_id, limit)
@@ -1,11 +1,19 @@
+import hashlib
 import os
+import threading
 import time
+from collections import OrderedDict
 import bcrypt
 import jwt
 
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALG = "HS256"
 JWT_EXPIRE_SECONDS = 3600 * 2 * 24 * 7
+# Verified tokens kept so repeated requests skip the signature check (0 disables it)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+_token_cache_lock = threading.Lock()
+_token_cache: "OrderedDict[bytes, dict]" = OrderedDict()
 
 
 def hash_password(plain: str) -> str:
@@ -35,4 +43,25 @@ def create_access_token(sub: str, extra: dict | None = None) -> str:
 
 
 def decode_token(token: str) -> dict:
-    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    if TOKEN_CACHE_SIZE <= 0:
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    with _token_cache_lock:
+        claims = _token_cache.get(key)
+        if claims is not None:
+            if claims.get("exp", 0) > time.time():
+                _token_cache.move_to_end(key)
+                return dict(claims)
+            # Expired: drop it and let jwt.decode raise the usual error
+            del _token_cache[key]
+
+    claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    # Only tokens with an expiry are cached, so no entry outlives its token
+    if "exp" in claims:
+        with _token_cache_lock:
+            _token_cache[key] = claims
+            _token_cache.move_to_end(key)
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return dict(claims)
@@ -0,0 +1,209 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from itertools import groupby
+from typing import List, Optional, Tuple
+from sqlmodel import Session
+from app import metrics
+from app.db import engine
+from app.models.bet import Bet
+from app.services.bets import update_bet_rows, upsert_bet_rows
+
+logger = logging.getLogger(__name__)
+
+# Off by default: every bet write commits on its own
+BET_WRITE_BUFFER_ENABLED = os.getenv("BET_WRITE_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+# A batch is flushed when it reaches this many writes...
+BET_WRITE_BUFFER_MAX_BATCH = int(os.getenv("BET_WRITE_BUFFER_MAX_BATCH", "500"))
+# ...or when its oldest write has waited this long
+BET_WRITE_BUFFER_MAX_WAIT_MS = float(os.getenv("BET_WRITE_BUFFER_MAX_WAIT_MS", "5"))
+# Writes waiting for a flush before submitters block
+BET_WRITE_BUFFER_QUEUE_LIMIT = int(os.getenv("BET_WRITE_BUFFER_QUEUE_LIMIT", "10000"))
+BET_WRITE_TIMEOUT_SECONDS = float(os.getenv("BET_WRITE_TIMEOUT_SECONDS", "10"))
+BET_WRITE_RETRY_AFTER_SECONDS = int(os.getenv("BET_WRITE_RETRY_AFTER_SECONDS", "1"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+UPSERT = "upsert"
+UPDATE = "update"
+
+
+class BetWriterBusy(Exception):
+    """Raised when a write was not taken into a batch in time; it was not written"""
+
+
+class _Write:
+    __slots__ = ("kind", "key", "row", "future", "result")
+
+    def __init__(self, kind: str, key: tuple, row: tuple):
+        self.kind = kind
+        self.key = key
+        self.row = row
+        self.future: Future = Future()
+        self.result: Optional[Tuple[bool, Optional[Bet]]] = None
+
+
+class BetWriter:
+    """
+    Group commit for bet writes during the kickoff rush.
+
+    Request threads queue validated writes and wait; one flusher thread
+    writes everything queued within a few milliseconds with a single
+    multi-row statement and one commit, then wakes every waiter with its own
+    result. A request is answered only once its batch is committed.
+
+    A write that times out before its batch is taken is withdrawn and
+    refused with BetWriterBusy; once taken, its submitter waits for the
+    outcome, so a write is never reported failed and committed anyway. If a
+    batch fails, its writes are retried one by one so only the bad ones fail.
+    """
+
+    def __init__(self, max_batch: int, max_wait_ms: float, queue_limit: int):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue(maxsize=queue_limit)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="bet-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the flusher"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def upsert(
+        self,
+        user_id: int,
+        match_id: int,
+        home_score_prediction: int,
+        away_score_prediction: int,
+        now: datetime,
+    ) -> Tuple[bool, Optional[Bet]]:
+        """Buffered upsert_bet; blocks until the batch is committed"""
+        return self._submit(
+            _Write(UPSERT, (user_id, match_id), (user_id, match_id, home_score_prediction, away_score_prediction, now))
+        )
+
+    def update(
+        self,
+        bet_id: int,
+        home_score_prediction: int,
+        away_score_prediction: int,
+        now: datetime,
+    ) -> Tuple[bool, Optional[Bet]]:
+        """Buffered update_bet_predictions; blocks until the batch is committed"""
+        return self._submit(_Write(UPDATE, (bet_id,), (bet_id, home_score_prediction, away_score_prediction, now)))
+
+    def _submit(self, write: _Write) -> Tuple[bool, Optional[Bet]]:
+        try:
+            self._queue.put(write, timeout=BET_WRITE_TIMEOUT_SECONDS)
+        except queue.Full:
+            metrics.increment("bet_write_rejected")
+            raise BetWriterBusy()
+        try:
+            return write.future.result(timeout=BET_WRITE_TIMEOUT_SECONDS)
+        except TimeoutError:
+            # Cancelling only succeeds while the flusher has not taken the write
+            if write.future.cancel():
+                metrics.increment("bet_write_rejected")
+                raise BetWriterBusy()
+            return write.future.result()
+
+    def _collect(self, first: _Write) -> Tuple[List[_Write], bool]:
+        """Gather a batch starting with first; also returns whether a stop was requested"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                write = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if write is None:
+                return batch, True
+            batch.append(write)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._flush(batch)
+        # Nothing may be left waiting once stopped
+        leftover = []
+        while True:
+            try:
+                write = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if write is not None:
+                leftover.append(write)
+        if leftover:
+            self._flush(leftover)
+
+    def _flush(self, batch: List[_Write]) -> None:
+        # Writes withdrawn by their timed-out submitter are dropped; the rest can no longer be withdrawn
+        batch = [write for write in batch if write.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                # Consecutive writes of the same kind share a statement, so arrival order is kept
+                for kind, run in groupby(batch, key=lambda write: write.kind):
+                    self._write_run(session, kind, list(run))
+                session.commit()
+        except Exception:
+            logger.exception("Flushing %d bet writes failed, retrying them one by one", len(batch))
+            self._flush_each(batch)
+            return
+        finally:
+            metrics.observe("bet_write_batch_size", len(batch), buckets=BATCH_SIZE_BUCKETS)
+            metrics.observe("bet_write_flush_seconds", time.perf_counter() - started)
+
+        for write in batch:
+            write.future.set_result(write.result)
+
+    def _flush_each(self, batch: List[_Write]) -> None:
+        """Write each of a failed batch in its own transaction, so one bad write fails alone"""
+        for write in batch:
+            try:
+                with Session(engine) as session:
+                    self._write_run(session, write.kind, [write])
+                    session.commit()
+            except Exception as e:
+                write.future.set_exception(e)
+            else:
+                write.future.set_result(write.result)
+
+    def _write_run(self, session: Session, kind: str, writes: List[_Write]) -> None:
+        # A statement can only write a row once, so the last write per key wins
+        # and earlier writes of the same key get its result
+        latest = {write.key: write for write in writes}
+        unique = list(latest.values())
+        rows = [write.row for write in unique]
+        results = upsert_bet_rows(session, rows) if kind == UPSERT else update_bet_rows(session, rows)
+        by_key = {write.key: result for write, result in zip(unique, results)}
+        for write in writes:
+            write.result = by_key[write.key]
+
+
+bet_writer = BetWriter(BET_WRITE_BUFFER_MAX_BATCH, BET_WRITE_BUFFER_MAX_WAIT_MS, BET_WRITE_BUFFER_QUEUE_LIMIT)
@@ -0,0 +1,316 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlmodel import Session
+from app.models.bet import Bet, BetPrediction
+
+BET_COLUMNS = "id, user_id, match_id, home_score_prediction, away_score_prediction, points_awarded, created_at, updated_at"
+
+# Creates or replaces a user's bet on a match that has not kicked off, in one
+# statement. The unique (user_id, match_id) index makes concurrent submissions
+# safe. Always returns one row: whether the match exists, and the bet when it
+# was written.
+UPSERT_BET_SQL = text(f"""
+    WITH target AS (
+        SELECT id, kickoff_at
+        FROM matches
+        WHERE id = :match_id
+    ),
+    written AS (
+        INSERT INTO bets AS b
+            (user_id, match_id, home_score_prediction, away_score_prediction, points_awarded, created_at, updated_at)
+        SELECT :user_id, t.id, :home_score_prediction, :away_score_prediction, 0, :now, :now
+        FROM target AS t
+        WHERE t.kickoff_at > :now
+        ON CONFLICT (user_id, match_id) DO UPDATE
+        SET home_score_prediction = EXCLUDED.home_score_prediction,
+            away_score_prediction = EXCLUDED.away_score_prediction,
+            updated_at = EXCLUDED.updated_at
+        RETURNING {BET_COLUMNS}
+    )
+    SELECT t.id IS NOT NULL AS found, w.*
+    FROM (SELECT 1) AS one
+    LEFT JOIN target AS t ON true
+    LEFT JOIN written AS w ON true
+""")
+
+# Changes the predictions of a bet whose match has not kicked off. Always
+# returns one row: whether the bet exists, and the bet when it was updated.
+UPDATE_BET_SQL = text(f"""
+    WITH target AS (
+        SELECT b.id, m.kickoff_at
+        FROM bets AS b
+        JOIN matches AS m ON m.id = b.match_id
+        WHERE b.id = :bet_id
+    ),
+    written AS (
+        UPDATE bets AS b
+        SET home_score_prediction = :home_score_prediction,
+            away_score_prediction = :away_score_prediction,
+            updated_at = :now
+        FROM target AS t
+        WHERE b.id = t.id
+          AND t.kickoff_at > :now
+        RETURNING {", ".join(f"b.{column}" for column in BET_COLUMNS.split(", "))}
+    )
+    SELECT t.id IS NOT NULL AS found, w.*
+    FROM (SELECT 1) AS one
+    LEFT JOIN target AS t ON true
+    LEFT JOIN written AS w ON true
+""")
+
+# Places or replaces many of one user's bets in one statement. Every input
+# row comes back with its match lookup, so the caller can tell saved, locked,
+# unknown and out-of-stage matches apart.
+UPSERT_BETS_SQL = text(f"""
+    WITH input AS (
+        SELECT *
+        FROM unnest(
+            CAST(:match_ids AS integer[]),
+            CAST(:home_score_predictions AS integer[]),
+            CAST(:away_score_predictions AS integer[])
+        ) WITH ORDINALITY AS i(match_id, home_score_prediction, away_score_prediction, position)
+    ),
+    checked AS (
+        SELECT i.*,
+               m.id IS NOT NULL AS found,
+               m.stage_id,
+               COALESCE(m.kickoff_at > :now, false) AS open
+        FROM input AS i
+        LEFT JOIN matches AS m ON m.id = i.match_id
+    ),
+    written AS (
+        INSERT INTO bets AS b
+            (user_id, match_id, home_score_prediction, away_score_prediction, points_awarded, created_at, updated_at)
+        SELECT :user_id, c.match_id, c.home_score_prediction, c.away_score_prediction, 0, :now, :now
+        FROM checked AS c
+        WHERE c.open
+          AND (CAST(:stage_id AS integer) IS NULL OR c.stage_id = CAST(:stage_id AS integer))
+        ON CONFLICT (user_id, match_id) DO UPDATE
+        SET home_score_prediction = EXCLUDED.home_score_prediction,
+            away_score_prediction = EXCLUDED.away_score_prediction,
+            updated_at = EXCLUDED.updated_at
+        RETURNING {BET_COLUMNS}
+    )
+    SELECT c.match_id AS requested_match_id, c.found, c.stage_id AS match_stage_id, c.open, w.*
+    FROM checked AS c
+    LEFT JOIN written AS w ON w.match_id = c.match_id
+    ORDER BY c.position
+""")
+
+# Group-commit variants of the two statements above, for many users at once.
+# Each row carries the time it was submitted, so buffering never changes
+# whether a bet was on time. Keys must be unique within a call.
+GROUP_UPSERT_BETS_SQL = text(f"""
+    WITH input AS (
+        SELECT *
+        FROM unnest(
+            CAST(:user_ids AS integer[]),
+            CAST(:match_ids AS integer[]),
+            CAST(:home_score_predictions AS integer[]),
+            CAST(:away_score_predictions AS integer[]),
+            CAST(:submitted_ats AS timestamp[])
+        ) WITH ORDINALITY AS i(user_id, match_id, home_score_prediction, away_score_prediction, submitted_at, position)
+    ),
+    checked AS (
+        SELECT i.*, m.id IS NOT NULL AS found, COALESCE(m.kickoff_at > i.submitted_at, false) AS open
+        FROM input AS i
+        LEFT JOIN matches AS m ON m.id = i.match_id
+    ),
+    written AS (
+        INSERT INTO bets AS b
+            (user_id, match_id, home_score_prediction, away_score_prediction, points_awarded, created_at, updated_at)
+        SELECT c.user_id, c.match_id, c.home_score_prediction, c.away_score_prediction, 0, c.submitted_at, c.submitted_at
+        FROM checked AS c
+        WHERE c.open
+        ON CONFLICT (user_id, match_id) DO UPDATE
+        SET home_score_prediction = EXCLUDED.home_score_prediction,
+            away_score_prediction = EXCLUDED.away_score_prediction,
+            updated_at = EXCLUDED.updated_at
+        RETURNING {BET_COLUMNS}
+    )
+    SELECT c.found, w.*
+    FROM checked AS c
+    LEFT JOIN written AS w ON w.user_id = c.user_id AND w.match_id = c.match_id
+    ORDER BY c.position
+""")
+
+GROUP_UPDATE_BETS_SQL = text(f"""
+    WITH input AS (
+        SELECT *
+        FROM unnest(
+            CAST(:bet_ids AS integer[]),
+            CAST(:home_score_predictions AS integer[]),
+            CAST(:away_score_predictions AS integer[]),
+            CAST(:submitted_ats AS timestamp[])
+        ) WITH ORDINALITY AS i(bet_id, home_score_prediction, away_score_prediction, submitted_at, position)
+    ),
+    checked AS (
+        SELECT i.*, b.id IS NOT NULL AS found, COALESCE(m.kickoff_at > i.submitted_at, false) AS open
+        FROM input AS i
+        LEFT JOIN bets AS b ON b.id = i.bet_id
+        LEFT JOIN matches AS m ON m.id = b.match_id
+    ),
+    written AS (
+        UPDATE bets AS b
+        SET home_score_prediction = c.home_score_prediction,
+            away_score_prediction = c.away_score_prediction,
+            updated_at = c.submitted_at
+        FROM checked AS c
+        WHERE b.id = c.bet_id
+          AND c.open
+        RETURNING {", ".join(f"b.{column}" for column in BET_COLUMNS.split(", "))}
+    )
+    SELECT c.found, w.*
+    FROM checked AS c
+    LEFT JOIN written AS w ON w.id = c.bet_id
+    ORDER BY c.position
+""")
+
+# (user_id, match_id, home_score_prediction, away_score_prediction, submitted_at)
+BetUpsertRow = Tuple[int, int, int, int, datetime]
+# (bet_id, home_score_prediction, away_score_prediction, submitted_at)
+BetUpdateRow = Tuple[int, int, int, datetime]
+
+
+def _result(row) -> Tuple[bool, Optional[Bet]]:
+    data = dict(row)
+    found = data.pop("found")
+    if data["id"] is None:
+        return found, None
+    return found, Bet(**data)
+
+
+def upsert_bet(
+    session: Session,
+    user_id: int,
+    match_id: int,
+    home_score_prediction: int,
+    away_score_prediction: int,
+    now: datetime,
+) -> Tuple[bool, Optional[Bet]]:
+    """
+    Place or replace a bet before kickoff, without committing.
+
+    Returns (match_found, bet); bet is None when the match has already started.
+    """
+    row = session.execute(
+        UPSERT_BET_SQL,
+        {
+            "user_id": user_id,
+            "match_id": match_id,
+            "home_score_prediction": home_score_prediction,
+            "away_score_prediction": away_score_prediction,
+            "now": now,
+        },
+    ).mappings().one()
+    return _result(row)
+
+
+def update_bet_predictions(
+    session: Session,
+    bet_id: int,
+    home_score_prediction: int,
+    away_score_prediction: int,
+    now: datetime,
+) -> Tuple[bool, Optional[Bet]]:
+    """
+    Change a bet's predictions before kickoff, without committing.
+
+    Returns (bet_found, bet); bet is None when the match has already started.
+    """
+    row = session.execute(
+        UPDATE_BET_SQL,
+        {
+            "bet_id": bet_id,
+            "home_score_prediction": home_score_prediction,
+            "away_score_prediction": away_score_prediction,
+            "now": now,
+        },
+    ).mappings().one()
+    return _result(row)
+
+
+def upsert_bets(
+    session: Session,
+    user_id: int,
+    predictions: List[BetPrediction],
+    now: datetime,
+    stage_id: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Place or replace many of a user's bets at once, without committing.
+
+    Match ids must be unique. Every kickoff is checked and every open bet
+    written in one statement. Returns one result per prediction, in order,
+    with a status of saved, locked, not_found or wrong_stage.
+    """
+    if not predictions:
+        return []
+
+    rows = session.execute(
+        UPSERT_BETS_SQL,
+        {
+            "user_id": user_id,
+            "match_ids": [prediction.match_id for prediction in predictions],
+            "home_score_predictions": [prediction.home_score_prediction for prediction in predictions],
+            "away_score_predictions": [prediction.away_score_prediction for prediction in predictions],
+            "stage_id": stage_id,
+            "now": now,
+        },
+    ).mappings().all()
+
+    results = []
+    for row in rows:
+        data = dict(row)
+        match_id = data.pop("requested_match_id")
+        found = data.pop("found")
+        match_stage_id = data.pop("match_stage_id")
+        is_open = data.pop("open")
+        if not found:
+            status = "not_found"
+        elif stage_id is not None and match_stage_id != stage_id:
+            status = "wrong_stage"
+        elif not is_open:
+            status = "locked"
+        else:
+            status = "saved"
+        results.append({"match_id": match_id, "status": status, "bet": Bet(**data) if status == "saved" else None})
+    return results
+
+
+def upsert_bet_rows(session: Session, rows: List[BetUpsertRow]) -> List[Tuple[bool, Optional[Bet]]]:
+    """Group-commit version of upsert_bet, one (match_found, bet) per row, in order"""
+    if not rows:
+        return []
+
+    user_ids, match_ids, home_score_predictions, away_score_predictions, submitted_ats = map(list, zip(*rows))
+    results = session.execute(
+        GROUP_UPSERT_BETS_SQL,
+        {
+            "user_ids": user_ids,
+            "match_ids": match_ids,
+            "home_score_predictions": home_score_predictions,
+            "away_score_predictions": away_score_predictions,
+            "submitted_ats": submitted_ats,
+        },
+    ).mappings().all()
+    return [_result(row) for row in results]
+
+
+def update_bet_rows(session: Session, rows: List[BetUpdateRow]) -> List[Tuple[bool, Optional[Bet]]]:
+    """Group-commit version of update_bet_predictions, one (bet_found, bet) per row, in order"""
+    if not rows:
+        return []
+
+    bet_ids, home_score_predictions, away_score_predictions, submitted_ats = map(list, zip(*rows))
+    results = session.execute(
+        GROUP_UPDATE_BETS_SQL,
+        {
+            "bet_ids": bet_ids,
+            "home_score_predictions": home_score_predictions,
+            "away_score_predictions": away_score_predictions,
+            "submitted_ats": submitted_ats,
+        },
+    ).mappings().all()
+    return [_result(row) for row in results]
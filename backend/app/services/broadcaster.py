@@ -0,0 +1,73 @@
+import asyncio
+import json
+import os
+from typing import Optional, Set
+from app import metrics
+
+# Events a subscriber may have pending before it is considered too slow
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+
+
+class Broadcaster:
+    """
+    In-process fan-out of server-sent events.
+
+    Every subscriber gets a bounded queue. An event is serialized once and
+    handed to each queue without waiting; a subscriber whose queue is full is
+    dropped, so one slow client never holds back the others or grows memory.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    def close(self) -> None:
+        """End every open stream; runs on the event loop"""
+        for queue in list(self._subscribers):
+            self._drop(queue)
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        metrics.set_gauge("events_subscribers", len(self._subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        metrics.set_gauge("events_subscribers", len(self._subscribers))
+
+    def publish(self, event: str, data: dict) -> None:
+        """Send an event to every subscriber; safe to call from any thread"""
+        if self._loop is None or not self._subscribers:
+            return
+        frame = f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+        self._loop.call_soon_threadsafe(self._fan_out, frame)
+
+    def _fan_out(self, frame: str) -> None:
+        metrics.increment("events_published")
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                metrics.increment("events_subscribers_dropped")
+                self._drop(queue)
+
+    def _drop(self, queue: asyncio.Queue) -> None:
+        """Unsubscribe and make room for the None that ends the stream"""
+        self.unsubscribe(queue)
+        while True:
+            try:
+                queue.put_nowait(None)
+                return
+            except asyncio.QueueFull:
+                queue.get_nowait()
+
+
+broadcaster = Broadcaster(EVENTS_QUEUE_SIZE)
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+import psycopg
+from sqlalchemy import text
+from sqlmodel import Session
+from app import metrics
+from app.db import engine
+
+logger = logging.getLogger(__name__)
+
+# Schedule changes are announced on this channel with the match id as payload
+KICKOFF_CHANNEL = "match_schedule"
+# Full reload interval, bounding staleness if a notification is ever missed
+KICKOFF_INDEX_REFRESH_SECONDS = float(os.getenv("KICKOFF_INDEX_REFRESH_SECONDS", "60"))
+# How often the listener wakes up to check for shutdown
+KICKOFF_LISTEN_TIMEOUT_SECONDS = 1.0
+
+ALL_KICKOFFS_SQL = text("SELECT id, kickoff_at, stage_id FROM matches")
+MATCH_KICKOFFS_SQL = text("""
+    SELECT id, kickoff_at, stage_id
+    FROM matches
+    WHERE id = ANY(CAST(:match_ids AS integer[]))
+""")
+NOTIFY_SQL = text(f"SELECT pg_notify('{KICKOFF_CHANNEL}', CAST(:match_id AS text))")
+
+
+def notify_schedule_change(session: Session, match_id: int) -> None:
+    """Announce a created or rescheduled match; delivered when the transaction commits"""
+    session.execute(NOTIFY_SQL, {"match_id": match_id})
+
+
+class KickoffIndex:
+    """
+    Process-wide match_id -> (kickoff_at, stage_id) map used to reject late
+    bets without a database read.
+
+    Kept current by the writes of this process, by LISTEN on
+    KICKOFF_CHANNEL for the other workers' writes, and by a periodic full
+    reload. The bet statements still check kickoff themselves, so a stale
+    entry can only delay a rejection, never let a late bet in.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._entries: Dict[int, Tuple[datetime, int]] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self) -> None:
+        with Session(engine) as session:
+            rows = session.execute(ALL_KICKOFFS_SQL).all()
+        entries = {row.id: (row.kickoff_at, row.stage_id) for row in rows}
+        with self._lock:
+            self._entries = entries
+        metrics.set_gauge("kickoff_index_matches", len(entries))
+
+    def refresh(self, match_ids: Iterable[int]) -> None:
+        match_ids = list(match_ids)
+        with Session(engine) as session:
+            rows = session.execute(MATCH_KICKOFFS_SQL, {"match_ids": match_ids}).all()
+        found = {row.id: (row.kickoff_at, row.stage_id) for row in rows}
+        with self._lock:
+            for match_id in match_ids:
+                if match_id in found:
+                    self._entries[match_id] = found[match_id]
+                else:
+                    self._entries.pop(match_id, None)
+
+    def put(self, match_id: int, kickoff_at: datetime, stage_id: int) -> None:
+        with self._lock:
+            self._entries[match_id] = (kickoff_at, stage_id)
+
+    def get(self, match_id: int) -> Optional[Tuple[datetime, int]]:
+        return self._entries.get(match_id)
+
+    def has_started(self, match_id: int, now: datetime) -> bool:
+        """True only when the match is known to have kicked off"""
+        entry = self._entries.get(match_id)
+        return entry is not None and now >= entry[0]
+
+    def start(self) -> None:
+        self.load()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen, name="kickoff-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=KICKOFF_LISTEN_TIMEOUT_SECONDS * 2)
+            self._thread = None
+
+    def _listen(self) -> None:
+        conninfo = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while not self._stopping.is_set():
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as connection:
+                    connection.execute(f"LISTEN {KICKOFF_CHANNEL}")
+                    # Catch up on anything missed while (re)connecting
+                    self.load()
+                    loaded_at = time.monotonic()
+                    while not self._stopping.is_set():
+                        match_ids = {
+                            int(notify.payload)
+                            for notify in connection.notifies(timeout=KICKOFF_LISTEN_TIMEOUT_SECONDS)
+                        }
+                        if match_ids:
+                            self.refresh(match_ids)
+                        if time.monotonic() - loaded_at >= self.refresh_seconds:
+                            self.load()
+                            loaded_at = time.monotonic()
+            except Exception:
+                logger.exception("Kickoff index listener failed, reconnecting")
+                self._stopping.wait(KICKOFF_LISTEN_TIMEOUT_SECONDS)
+
+
+kickoff_index = KickoffIndex(KICKOFF_INDEX_REFRESH_SECONDS)
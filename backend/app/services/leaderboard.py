@@ -0,0 +1,194 @@
+import base64
+import json
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.user import LeaderboardEntry
+
+# A cursor is the full sort key of a row: (score, correct_results,
+# lone_wolf_victories, defeats, id). The id makes the ordering total.
+Cursor = Tuple[int, int, int, int, int]
+
+LEADERBOARD_COLUMNS = "id, username, score, correct_results, lone_wolf_victories, defeats"
+
+# Same order as the ix_users_leaderboard index
+LEADERBOARD_ORDER = "score DESC, correct_results DESC, lone_wolf_victories DESC, defeats ASC, id ASC"
+REVERSE_LEADERBOARD_ORDER = "score ASC, correct_results ASC, lone_wolf_victories ASC, defeats DESC, id DESC"
+
+
+def _ahead_of(row: str, key: str, include_id: bool) -> str:
+    """
+    SQL predicate for "<row> ranks ahead of <key>" under the leaderboard order.
+
+    The order mixes directions, so a row value comparison cannot be used and
+    the predicate is spelled out column by column. With include_id the id is
+    part of the key (strict total order), otherwise rows tied on every
+    tie-breaker are not considered ahead.
+    """
+    if include_id:
+        last = f"({row}.defeats < {key}.defeats OR ({row}.defeats = {key}.defeats AND {row}.id < {key}.id))"
+    else:
+        last = f"{row}.defeats < {key}.defeats"
+    return (
+        f"({row}.score > {key}.score OR ({row}.score = {key}.score AND "
+        f"({row}.correct_results > {key}.correct_results OR ({row}.correct_results = {key}.correct_results AND "
+        f"({row}.lone_wolf_victories > {key}.lone_wolf_victories OR "
+        f"({row}.lone_wolf_victories = {key}.lone_wolf_victories AND {last}))))))"
+    )
+
+
+def _same_rank_as(row: str, key: str) -> str:
+    return (
+        f"({row}.score = {key}.score AND {row}.correct_results = {key}.correct_results AND "
+        f"{row}.lone_wolf_victories = {key}.lone_wolf_victories AND {row}.defeats = {key}.defeats)"
+    )
+
+
+def _after(row: str, key: str, inclusive: bool) -> str:
+    """
+    SQL predicate for "<row> comes after <key>" in the total leaderboard order.
+
+    The redundant leading score bound lets Postgres turn it into an index
+    condition and start the scan at the cursor.
+    """
+    return (
+        f"{row}.score <= {key}.score AND "
+        f"({row}.score < {key}.score OR ({row}.score = {key}.score AND "
+        f"({row}.correct_results < {key}.correct_results OR ({row}.correct_results = {key}.correct_results AND "
+        f"({row}.lone_wolf_victories < {key}.lone_wolf_victories OR "
+        f"({row}.lone_wolf_victories = {key}.lone_wolf_victories AND "
+        f"({row}.defeats > {key}.defeats OR ({row}.defeats = {key}.defeats AND "
+        f"{row}.id {'>=' if inclusive else '>'} {key}.id))))))))"
+    )
+
+
+# Rows after a cursor come out of the index in order. Ranks are computed for
+# the page only: the first row's rank counts the users strictly ahead of it
+# (an index range count), the rest follow from a window over the page. Rows
+# tied with the first row but already shown on a previous page still push the
+# later groups down, hence ties_before.
+def _page_sql(after_cursor: bool, inclusive: bool) -> str:
+    where = _after("u", "c", inclusive) if after_cursor else "TRUE"
+    return f"""
+        WITH c AS (
+            SELECT CAST(:score AS integer) AS score,
+                   CAST(:correct_results AS integer) AS correct_results,
+                   CAST(:lone_wolf_victories AS integer) AS lone_wolf_victories,
+                   CAST(:defeats AS integer) AS defeats,
+                   CAST(:id AS integer) AS id
+        ),
+        page AS (
+            SELECT u.id, u.username, u.score, u.correct_results, u.lone_wolf_victories, u.defeats
+            FROM users AS u, c
+            WHERE {where}
+            ORDER BY {LEADERBOARD_ORDER}
+            LIMIT :limit
+        ),
+        first_row AS (
+            SELECT * FROM page ORDER BY {LEADERBOARD_ORDER} LIMIT 1
+        ),
+        base AS (
+            SELECT
+                (SELECT COUNT(*) FROM users AS u, first_row AS f
+                 WHERE {_ahead_of('u', 'f', include_id=False)}) AS ahead,
+                (SELECT COUNT(*) FROM users AS u, first_row AS f
+                 WHERE {_same_rank_as('u', 'f')} AND u.id < f.id) AS ties_before
+        )
+        SELECT p.id, p.username, p.score, p.correct_results, p.lone_wolf_victories, p.defeats,
+               b.ahead + RANK() OVER w
+               + CASE WHEN RANK() OVER w > 1 THEN b.ties_before ELSE 0 END AS rank
+        FROM page AS p CROSS JOIN base AS b
+        WINDOW w AS (ORDER BY p.score DESC, p.correct_results DESC,
+                     p.lone_wolf_victories DESC, p.defeats ASC)
+        ORDER BY p.score DESC, p.correct_results DESC, p.lone_wolf_victories DESC, p.defeats ASC, p.id ASC
+    """
+
+
+FULL_LEADERBOARD_SQL = text(f"""
+    SELECT {LEADERBOARD_COLUMNS},
+           RANK() OVER (ORDER BY score DESC, correct_results DESC,
+                        lone_wolf_victories DESC, defeats ASC) AS rank
+    FROM users
+    ORDER BY {LEADERBOARD_ORDER}
+""")
+
+FIRST_PAGE_SQL = text(_page_sql(after_cursor=False, inclusive=False))
+NEXT_PAGE_SQL = text(_page_sql(after_cursor=True, inclusive=False))
+FROM_ROW_SQL = text(_page_sql(after_cursor=True, inclusive=True))
+
+# Walks backwards from a user to find where a window centered on them starts
+PRECEDING_ROWS_SQL = text(f"""
+    SELECT u.score, u.correct_results, u.lone_wolf_victories, u.defeats, u.id
+    FROM users AS u, users AS me
+    WHERE me.id = :user_id
+      AND {_ahead_of('u', 'me', include_id=True)}
+    ORDER BY {REVERSE_LEADERBOARD_ORDER}
+    LIMIT :limit
+""")
+
+USER_KEY_SQL = text("""
+    SELECT score, correct_results, lone_wolf_victories, defeats, id
+    FROM users
+    WHERE id = :user_id
+""")
+
+
+def encode_cursor(entry: LeaderboardEntry) -> str:
+    key = [entry.score, entry.correct_results, entry.lone_wolf_victories, entry.defeats, entry.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decode a pagination cursor, raising ValueError when it is malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(key, list) or len(key) != 5 or not all(isinstance(value, int) for value in key):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def _cursor_params(cursor: Optional[Cursor]) -> dict:
+    score, correct_results, lone_wolf_victories, defeats, user_id = cursor or (None, None, None, None, None)
+    return {
+        "score": score,
+        "correct_results": correct_results,
+        "lone_wolf_victories": lone_wolf_victories,
+        "defeats": defeats,
+        "id": user_id,
+    }
+
+
+async def get_full_leaderboard(session: AsyncSession) -> List[LeaderboardEntry]:
+    """Whole leaderboard with server-computed ranks (ties share a rank)"""
+    rows = (await session.execute(FULL_LEADERBOARD_SQL)).mappings().all()
+    return [LeaderboardEntry(**row) for row in rows]
+
+
+async def get_leaderboard_page(
+    session: AsyncSession,
+    limit: int,
+    cursor: Optional[Cursor] = None,
+    inclusive: bool = False,
+) -> List[LeaderboardEntry]:
+    """Page of the leaderboard starting after (or at, when inclusive) the cursor"""
+    if cursor is None:
+        statement = FIRST_PAGE_SQL
+    else:
+        statement = FROM_ROW_SQL if inclusive else NEXT_PAGE_SQL
+    params = _cursor_params(cursor)
+    params["limit"] = limit
+    rows = (await session.execute(statement, params)).mappings().all()
+    return [LeaderboardEntry(**row) for row in rows]
+
+
+async def get_leaderboard_around(session: AsyncSession, user_id: int, limit: int) -> List[LeaderboardEntry]:
+    """Window of `limit` rows centered on the given user"""
+    user_key = (await session.execute(USER_KEY_SQL, {"user_id": user_id})).first()
+    if user_key is None:
+        return []
+
+    preceding = (await session.execute(PRECEDING_ROWS_SQL, {"user_id": user_id, "limit": limit // 2})).all()
+    start = tuple(preceding[-1]) if preceding else tuple(user_key)
+    return await get_leaderboard_page(session, limit, cursor=start, inclusive=True)
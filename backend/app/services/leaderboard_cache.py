@@ -0,0 +1,77 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from app import metrics
+
+# Upper bound on how long a cached leaderboard is served. Invalidation is
+# per process, so this is what bounds staleness across several workers.
+LEADERBOARD_CACHE_TTL_SECONDS = float(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", "30"))
+
+
+@dataclass(frozen=True)
+class CachedLeaderboard:
+    version: int
+    etag: str
+    body: bytes
+    built_at: float
+
+
+class LeaderboardCache:
+    """
+    Process-level cache of the serialized leaderboard.
+
+    Every score change bumps the version; entries built for an older version
+    are never served, and a rebuild that raced with an invalidation is not
+    stored.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entry: Optional[CachedLeaderboard] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self) -> Optional[CachedLeaderboard]:
+        entry = self._entry
+        if (
+            entry is not None
+            and entry.version == self._version
+            and time.monotonic() - entry.built_at < self.ttl_seconds
+        ):
+            metrics.increment("leaderboard_cache_hits")
+            return entry
+        metrics.increment("leaderboard_cache_misses")
+        return None
+
+    def store(self, version: int, body: bytes) -> CachedLeaderboard:
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        entry = CachedLeaderboard(version=version, etag=etag, body=body, built_at=time.monotonic())
+        with self._lock:
+            if version == self._version:
+                self._entry = entry
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entry = None
+        metrics.increment("leaderboard_cache_invalidations")
+
+
+leaderboard_cache = LeaderboardCache(LEADERBOARD_CACHE_TTL_SECONDS)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against a strong ETag"""
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so W/ prefixed tags still match
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import text
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.score_event import StandingEntry
+
+# users.score is a projection of the score_events ledger; this rebuilds it in
+# one GROUP BY and only rewrites rows that drifted.
+REBUILD_SCORES_SQL = text("""
+    WITH totals AS (
+        SELECT u.id, COALESCE(SUM(e.delta), 0) AS score
+        FROM users AS u
+        LEFT JOIN score_events AS e ON e.user_id = u.id
+        GROUP BY u.id
+    )
+    UPDATE users AS u
+    SET score = t.score,
+        updated_at = :now
+    FROM totals AS t
+    WHERE u.id = t.id
+      AND u.score <> t.score
+""")
+
+_STANDINGS_SQL = """
+    WITH totals AS (
+        SELECT e.user_id, SUM(e.delta) AS score
+        FROM score_events AS e
+        WHERE {condition}
+        GROUP BY e.user_id
+    )
+    SELECT u.id, u.username, COALESCE(t.score, 0) AS score,
+           RANK() OVER (ORDER BY COALESCE(t.score, 0) DESC) AS rank
+    FROM users AS u
+    LEFT JOIN totals AS t ON t.user_id = u.id
+    ORDER BY score DESC, u.id
+"""
+
+# Opening balances have no stage and count from the start
+STANDINGS_AS_OF_STAGE_SQL = text(_STANDINGS_SQL.format(condition="""
+    e.stage_id IS NULL
+    OR e.stage_id IN (
+        SELECT s.id
+        FROM stages AS s
+        WHERE s.date <= (SELECT date FROM stages WHERE id = :stage_id)
+    )
+"""))
+
+STANDINGS_AS_OF_TIME_SQL = text(_STANDINGS_SQL.format(condition="e.created_at <= :as_of"))
+
+
+def rebuild_scores_from_ledger(session: Session) -> int:
+    """Recompute users.score from the ledger, without committing. Returns the number of users fixed"""
+    return session.execute(REBUILD_SCORES_SQL, {"now": datetime.now()}).rowcount
+
+
+async def get_standings_as_of_stage(session: AsyncSession, stage_id: int) -> List[StandingEntry]:
+    """Scores as they stood once the given stage and every earlier one were counted"""
+    rows = (await session.execute(STANDINGS_AS_OF_STAGE_SQL, {"stage_id": stage_id})).mappings().all()
+    return [StandingEntry(**row) for row in rows]
+
+
+async def get_standings_as_of_time(session: AsyncSession, as_of: datetime) -> List[StandingEntry]:
+    """Scores as they stood at the given moment"""
+    rows = (await session.execute(STANDINGS_AS_OF_TIME_SQL, {"as_of": as_of})).mappings().all()
+    return [StandingEntry(**row) for row in rows]
@@ -0,0 +1,53 @@
+import logging
+from typing import List
+from sqlalchemy import text
+from sqlmodel import Session
+from app.db import engine
+from app.services.broadcaster import broadcaster
+
+logger = logging.getLogger(__name__)
+
+LIVE_MATCHES_SQL = text("""
+    SELECT id, stage_id, home_score, away_score
+    FROM matches
+    WHERE id = ANY(CAST(:match_ids AS integer[]))
+    ORDER BY id
+""")
+
+# Overall rank of the users who bet on the matches, in the leaderboard order
+LIVE_USERS_SQL = text("""
+    WITH ranked AS (
+        SELECT id, score, correct_results, lone_wolf_victories, defeats,
+               RANK() OVER (
+                   ORDER BY score DESC, correct_results DESC, lone_wolf_victories DESC, defeats ASC
+               ) AS rank
+        FROM users
+    )
+    SELECT r.id, r.rank, r.score, r.correct_results, r.lone_wolf_victories, r.defeats
+    FROM ranked AS r
+    WHERE r.id IN (SELECT user_id FROM bets WHERE match_id = ANY(CAST(:match_ids AS integer[])))
+    ORDER BY r.rank, r.id
+""")
+
+
+def publish_score_update(match_ids: List[int]) -> None:
+    """
+    Push the new results and their bettors' standings to live subscribers.
+
+    Runs after the settlement committed, in its own session. Nothing is read
+    when nobody is listening. Failures are logged only, the settlement
+    already succeeded and clients catch up on their next fetch.
+    """
+    if not match_ids or not broadcaster.has_subscribers():
+        return
+
+    try:
+        with Session(engine) as session:
+            params = {"match_ids": match_ids}
+            matches = [dict(row) for row in session.execute(LIVE_MATCHES_SQL, params).mappings()]
+            users = [dict(row) for row in session.execute(LIVE_USERS_SQL, params).mappings()]
+    except Exception:
+        logger.exception("Could not load the live update for matches %s", match_ids)
+        return
+
+    broadcaster.publish("scores", {"matches": matches, "users": users})
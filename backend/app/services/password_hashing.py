@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+from app import metrics
+from app.security import hash_password, verify_password
+
+# bcrypt runs in a dedicated process pool so login storms cannot hold the
+# API workers. Requests beyond the queue limit are refused straight away.
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+PASSWORD_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_RETRY_AFTER_SECONDS", "1"))
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # The pool starts after the app's threads (kickoff listener, bet writer,
+            # event loop); forking then could copy a lock some thread holds, so
+            # workers come from a clean forkserver process instead
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_POOL_SIZE,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _executor
+
+
+def _submit(fn, *args) -> Future:
+    """Queue bcrypt work, refusing it when PASSWORD_QUEUE_LIMIT calls are already pending"""
+    global _pending
+    with _lock:
+        if _pending >= PASSWORD_QUEUE_LIMIT:
+            metrics.increment("password_pool_rejected")
+            raise PasswordPoolBusy()
+        _pending += 1
+        metrics.set_gauge("password_pool_queue_depth", _pending)
+
+    started = time.perf_counter()
+
+    def _done(_: Future) -> None:
+        global _pending
+        with _lock:
+            _pending -= 1
+            metrics.set_gauge("password_pool_queue_depth", _pending)
+        metrics.observe("password_hash_seconds", time.perf_counter() - started)
+
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _done(None)
+        raise
+    future.add_done_callback(_done)
+    return future
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await asyncio.wrap_future(_submit(verify_password, plain, hashed))
+
+
+async def hash_password_async(plain: str) -> str:
+    return await asyncio.wrap_future(_submit(hash_password, plain))
+
+
+def hash_password_pooled(plain: str) -> str:
+    """Blocking variant for sync endpoints, which already run in the threadpool"""
+    return _submit(hash_password, plain).result()
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,181 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import text
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.rank_snapshot import RankMover, RankTrajectoryEntry
+
+# Snapshots the overall standings after every fully settled stage, from the
+# per-stage aggregates and the opening balances of the ledger. Stages dated
+# from the earliest affected one on are refreshed, because their standings
+# are cumulative. Passing no match ids refreshes every stage.
+#
+# Each stage's aggregates are bucketed under the first target date on or
+# after it, and a running sum per user over those dates gives every target's
+# totals, so the work grows with users x stages rather than with the square
+# of the stages.
+SNAPSHOT_STAGES_SQL = text("""
+    WITH targets AS (
+        SELECT s.id, s.date
+        FROM stages AS s
+        WHERE (
+                CAST(:match_ids AS integer[]) IS NULL
+                OR s.date >= (
+                    SELECT MIN(ms.date)
+                    FROM matches AS m
+                    JOIN stages AS ms ON ms.id = m.stage_id
+                    WHERE m.id = ANY(CAST(:match_ids AS integer[]))
+                )
+            )
+          AND EXISTS (SELECT 1 FROM matches AS m WHERE m.stage_id = s.id)
+          AND NOT EXISTS (
+              SELECT 1
+              FROM matches AS m
+              WHERE m.stage_id = s.id
+                AND (m.home_score IS NULL OR m.away_score IS NULL)
+          )
+    ),
+    target_dates AS (
+        SELECT DISTINCT date
+        FROM targets
+    ),
+    buckets AS (
+        SELECT s.id AS stage_id, MIN(d.date) AS date
+        FROM stages AS s
+        JOIN target_dates AS d ON d.date >= s.date
+        GROUP BY s.id
+    ),
+    bucket_totals AS (
+        SELECT p.user_id,
+               b.date,
+               SUM(p.points) AS points,
+               SUM(p.exact_hits) AS correct_results,
+               SUM(p.lone_wolves) AS lone_wolf_victories,
+               SUM(p.defeats) AS defeats
+        FROM user_stage_points AS p
+        JOIN buckets AS b ON b.stage_id = p.stage_id
+        GROUP BY p.user_id, b.date
+    ),
+    openings AS (
+        SELECT user_id, SUM(delta) AS points
+        FROM score_events
+        WHERE match_id IS NULL
+        GROUP BY user_id
+    ),
+    running AS (
+        SELECT u.id AS user_id,
+               d.date,
+               COALESCE(o.points, 0) + SUM(COALESCE(bt.points, 0)) OVER w AS score,
+               SUM(COALESCE(bt.correct_results, 0)) OVER w AS correct_results,
+               SUM(COALESCE(bt.lone_wolf_victories, 0)) OVER w AS lone_wolf_victories,
+               SUM(COALESCE(bt.defeats, 0)) OVER w AS defeats
+        FROM users AS u
+        CROSS JOIN target_dates AS d
+        LEFT JOIN openings AS o ON o.user_id = u.id
+        LEFT JOIN bucket_totals AS bt ON bt.user_id = u.id AND bt.date = d.date
+        WINDOW w AS (PARTITION BY u.id ORDER BY d.date)
+    ),
+    totals AS (
+        SELECT t.id AS stage_id,
+               r.user_id,
+               r.score,
+               r.correct_results,
+               r.lone_wolf_victories,
+               r.defeats
+        FROM targets AS t
+        JOIN running AS r ON r.date = t.date
+    )
+    INSERT INTO user_rank_snapshots AS r
+        (stage_id, user_id, rank, score, correct_results, lone_wolf_victories, defeats, created_at)
+    SELECT stage_id,
+           user_id,
+           RANK() OVER (
+               PARTITION BY stage_id
+               ORDER BY score DESC, correct_results DESC, lone_wolf_victories DESC, defeats ASC
+           ),
+           score,
+           correct_results,
+           lone_wolf_victories,
+           defeats,
+           :now
+    FROM totals
+    ON CONFLICT (stage_id, user_id) DO UPDATE
+    SET rank = EXCLUDED.rank,
+        score = EXCLUDED.score,
+        correct_results = EXCLUDED.correct_results,
+        lone_wolf_victories = EXCLUDED.lone_wolf_victories,
+        defeats = EXCLUDED.defeats,
+        created_at = EXCLUDED.created_at
+    WHERE (r.rank, r.score, r.correct_results, r.lone_wolf_victories, r.defeats)
+          IS DISTINCT FROM
+          (EXCLUDED.rank, EXCLUDED.score, EXCLUDED.correct_results, EXCLUDED.lone_wolf_victories, EXCLUDED.defeats)
+""")
+
+DELETE_SNAPSHOTS_SQL = text("DELETE FROM user_rank_snapshots")
+
+# Served by the (user_id, stage_id) index; movement compares with the previous snapshot
+RANK_TRAJECTORY_SQL = text("""
+    SELECT s.id AS stage_id,
+           s.name AS stage_name,
+           s.date AS stage_date,
+           r.rank,
+           r.score,
+           LAG(r.rank) OVER (ORDER BY s.date, s.id) - r.rank AS movement
+    FROM user_rank_snapshots AS r
+    JOIN stages AS s ON s.id = r.stage_id
+    WHERE r.user_id = :user_id
+    ORDER BY s.date, s.id
+""")
+
+# Compares a stage's snapshot with the latest snapshotted stage before it
+STAGE_MOVERS_SQL = text("""
+    WITH previous_stage AS (
+        SELECT s.id
+        FROM stages AS s
+        JOIN stages AS target ON target.id = :stage_id
+        WHERE (s.date, s.id) < (target.date, target.id)
+          AND EXISTS (SELECT 1 FROM user_rank_snapshots AS r WHERE r.stage_id = s.id)
+        ORDER BY s.date DESC, s.id DESC
+        LIMIT 1
+    )
+    SELECT u.id,
+           u.username,
+           r.rank,
+           p.rank AS previous_rank,
+           p.rank - r.rank AS movement,
+           r.score
+    FROM user_rank_snapshots AS r
+    JOIN user_rank_snapshots AS p
+      ON p.user_id = r.user_id AND p.stage_id = (SELECT id FROM previous_stage)
+    JOIN users AS u ON u.id = r.user_id
+    WHERE r.stage_id = :stage_id
+      AND p.rank <> r.rank
+    ORDER BY ABS(p.rank - r.rank) DESC, r.rank, u.id
+    LIMIT :limit
+""")
+
+
+def refresh_rank_snapshots(session: Session, match_ids: Optional[List[int]], now: datetime) -> int:
+    """
+    Snapshot the standings of the stages affected by settling the given
+    matches, without committing. A stage is only snapshotted once all of its
+    matches have a result; snapshots of later stages are refreshed too.
+    Returns the number of snapshot rows written.
+    """
+    return session.execute(SNAPSHOT_STAGES_SQL, {"match_ids": match_ids, "now": now}).rowcount
+
+
+def rebuild_rank_snapshots(session: Session, now: datetime) -> int:
+    """Drop and recompute every snapshot, without committing"""
+    session.execute(DELETE_SNAPSHOTS_SQL)
+    return refresh_rank_snapshots(session, None, now)
+
+
+async def get_rank_trajectory(session: AsyncSession, user_id: int) -> List[RankTrajectoryEntry]:
+    rows = (await session.execute(RANK_TRAJECTORY_SQL, {"user_id": user_id})).mappings().all()
+    return [RankTrajectoryEntry(**row) for row in rows]
+
+
+async def get_stage_movers(session: AsyncSession, stage_id: int, limit: int) -> List[RankMover]:
+    rows = (await session.execute(STAGE_MOVERS_SQL, {"stage_id": stage_id, "limit": limit})).mappings().all()
+    return [RankMover(**row) for row in rows]
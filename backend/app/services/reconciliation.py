@@ -0,0 +1,352 @@
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import text
+from sqlmodel import Session
+from app.services.rank_snapshots import refresh_rank_snapshots
+from app.services.scoring import bet_points_sql
+
+# How many differing rows are listed in a report; counts are always complete
+RECONCILE_SAMPLE_SIZE = 100
+
+# Blocks new settlement jobs and job completions until the repair commits.
+# Workers claim and finish jobs with UPDATEs, which conflict with SHARE.
+LOCK_SETTLEMENT_JOBS_SQL = text("LOCK TABLE settlement_jobs IN SHARE MODE")
+
+# Jobs that will still run: running ones, and pending ones not stuck behind a
+# failed job of their match
+UNFINISHED_JOBS_SQL = text("""
+    SELECT COUNT(*)
+    FROM settlement_jobs AS j
+    WHERE j.status = 'running'
+       OR (
+           j.status = 'pending'
+           AND NOT EXISTS (
+               SELECT 1
+               FROM settlement_jobs AS f
+               WHERE f.match_id = j.match_id
+                 AND f.id < j.id
+                 AND f.status = 'failed'
+           )
+       )
+""")
+
+# Matches already hold their latest result, so once the repair settled every
+# bet from them, failed jobs and the jobs queued behind them have nothing
+# left to do
+SUPERSEDE_JOBS_SQL = text("""
+    UPDATE settlement_jobs
+    SET status = 'superseded',
+        error = COALESCE(error || '; ', '') || 'Superseded by reconciliation',
+        finished_at = :now
+    WHERE status IN ('failed', 'pending')
+""")
+
+
+class SettlementInProgress(Exception):
+    """Raised when a repair would race queued or running settlement jobs"""
+
+
+# What a bet should hold given its match result: bets of unsettled matches
+# should hold no points
+EXPECTED_POINTS = f"""
+    CASE WHEN m.home_score IS NOT NULL AND m.away_score IS NOT NULL
+         THEN {bet_points_sql("b.home_score_prediction", "b.away_score_prediction", "m.home_score", "m.away_score")}
+         ELSE 0 END
+"""
+
+IS_EXACT = "(b.home_score_prediction = m.home_score AND b.away_score_prediction = m.away_score)"
+
+# Per user: the bets whose stored points differ from the expected ones, the
+# expected points and tie-breaking stats, and a fingerprint of the expected
+# points of each match to check the ledger against. A plain aggregate with
+# no window over the bets, so Postgres can spread the scan over parallel
+# workers.
+BET_TOTALS_SQL = text(f"""
+    CREATE TEMP TABLE bet_totals ON COMMIT DROP AS
+    SELECT b.user_id,
+           COUNT(*) AS bets,
+           COUNT(*) FILTER (WHERE b.points_awarded <> {EXPECTED_POINTS}) AS bet_diffs,
+           SUM({EXPECTED_POINTS}) AS points,
+           SUM(({EXPECTED_POINTS}) * hashint4(b.match_id)::bigint) AS ledger_fingerprint,
+           COUNT(*) FILTER (WHERE {IS_EXACT}) AS exact_hits,
+           COUNT(*) FILTER (
+               WHERE m.home_score IS NOT NULL AND m.away_score IS NOT NULL AND {EXPECTED_POINTS} = 0
+           ) AS defeats
+    FROM bets AS b
+    JOIN matches AS m ON m.id = b.match_id
+    GROUP BY b.user_id
+""")
+
+# Exact hits per match and who scored one, which is enough to tell the lone
+# wolves. Only exact bets reach the aggregate.
+MATCH_EXACT_HITS_SQL = text(f"""
+    CREATE TEMP TABLE match_exact_hits ON COMMIT DROP AS
+    SELECT b.match_id, COUNT(*) AS exact_hits, MIN(b.user_id) AS user_id
+    FROM bets AS b
+    JOIN matches AS m ON m.id = b.match_id
+    WHERE {IS_EXACT}
+    GROUP BY b.match_id
+""")
+
+# What every user should hold: ledger adjustments that do not come from a
+# match (opening balances) plus the expected points of their bets, and the
+# tie-breaking stats derived from the expected points. The ledger is summed
+# and fingerprinted per user in one pass; a user whose match entries add up
+# to other points per match than their bets would (short of a collision of
+# the 32-bit match hashes) gets ledger_drifted, and only those users' ledgers
+# are compared entry by entry.
+EXPECTED_USERS_SQL = text("""
+    CREATE TEMP TABLE expected_users ON COMMIT DROP AS
+    WITH ledger AS (
+        SELECT user_id,
+               SUM(delta) FILTER (WHERE match_id IS NULL) AS opening_points,
+               SUM(delta) FILTER (WHERE match_id IS NOT NULL) AS match_points,
+               SUM(delta * hashint4(match_id)::bigint) FILTER (WHERE match_id IS NOT NULL) AS match_fingerprint
+        FROM score_events
+        GROUP BY user_id
+    ),
+    lone_wolves AS (
+        SELECT user_id, COUNT(*) AS victories
+        FROM match_exact_hits
+        WHERE exact_hits = 1
+        GROUP BY user_id
+    )
+    SELECT u.id,
+           u.username,
+           u.score AS actual_score,
+           COALESCE(l.opening_points, 0) + COALESCE(t.points, 0) AS expected_score,
+           u.correct_results AS actual_correct_results,
+           COALESCE(t.exact_hits, 0) AS expected_correct_results,
+           u.lone_wolf_victories AS actual_lone_wolf_victories,
+           COALESCE(w.victories, 0) AS expected_lone_wolf_victories,
+           u.defeats AS actual_defeats,
+           COALESCE(t.defeats, 0) AS expected_defeats,
+           COALESCE(t.bets, 0) AS bets,
+           COALESCE(t.bet_diffs, 0) AS bet_diffs,
+           (COALESCE(l.match_points, 0), COALESCE(l.match_fingerprint, 0))
+               IS DISTINCT FROM (COALESCE(t.points, 0), COALESCE(t.ledger_fingerprint, 0)) AS ledger_drifted
+    FROM users AS u
+    LEFT JOIN bet_totals AS t ON t.user_id = u.id
+    LEFT JOIN ledger AS l ON l.user_id = u.id
+    LEFT JOIN lone_wolves AS w ON w.user_id = u.id
+""")
+
+# Statistics for the per-user lookups below, so users without differences
+# cost nothing instead of a scan of bets or the ledger
+ANALYZE_EXPECTED_USERS_SQL = text("ANALYZE expected_users")
+
+# The differing bets, read through the (user_id, match_id) index of the users that have any
+BET_DIFFS_SQL = text(f"""
+    CREATE TEMP TABLE bet_diffs ON COMMIT DROP AS
+    SELECT b.id,
+           b.user_id,
+           b.match_id,
+           m.stage_id,
+           b.points_awarded AS actual_points,
+           {EXPECTED_POINTS} AS expected_points
+    FROM expected_users AS u
+    JOIN bets AS b ON b.user_id = u.id
+    JOIN matches AS m ON m.id = b.match_id
+    WHERE u.bet_diffs > 0
+      AND b.points_awarded <> {EXPECTED_POINTS}
+""")
+
+# Per (user, match), what the ledger of a drifted user is missing to agree
+# with the expected points
+LEDGER_DIFFS_SQL = text(f"""
+    CREATE TEMP TABLE ledger_diffs ON COMMIT DROP AS
+    WITH drifted AS (
+        SELECT id
+        FROM expected_users
+        WHERE ledger_drifted
+    ),
+    expected AS (
+        SELECT b.user_id, b.match_id, {EXPECTED_POINTS} AS points
+        FROM drifted AS d
+        JOIN bets AS b ON b.user_id = d.id
+        JOIN matches AS m ON m.id = b.match_id
+    ),
+    ledger AS (
+        SELECT e.user_id, e.match_id, SUM(e.delta) AS points
+        FROM drifted AS d
+        JOIN score_events AS e ON e.user_id = d.id
+        WHERE e.match_id IS NOT NULL
+        GROUP BY e.user_id, e.match_id
+    )
+    SELECT COALESCE(x.user_id, l.user_id) AS user_id,
+           COALESCE(x.match_id, l.match_id) AS match_id,
+           COALESCE(x.points, 0) - COALESCE(l.points, 0) AS delta
+    FROM expected AS x
+    FULL OUTER JOIN ledger AS l ON l.user_id = x.user_id AND l.match_id = x.match_id
+    WHERE COALESCE(x.points, 0) <> COALESCE(l.points, 0)
+""")
+
+USER_DIFF_CONDITION = """
+    (actual_score, actual_correct_results, actual_lone_wolf_victories, actual_defeats)
+    IS DISTINCT FROM
+    (expected_score, expected_correct_results, expected_lone_wolf_victories, expected_defeats)
+"""
+
+COUNT_DIFFS_SQL = text(f"""
+    SELECT
+        (SELECT CAST(COALESCE(SUM(bets), 0) AS bigint) FROM expected_users) AS bets_checked,
+        (SELECT COUNT(*) FROM bet_diffs) AS bet_diffs,
+        (SELECT COUNT(*) FROM expected_users) AS users_checked,
+        (SELECT COUNT(*) FROM expected_users WHERE {USER_DIFF_CONDITION}) AS user_diffs,
+        (SELECT COUNT(*) FROM ledger_diffs) AS ledger_diffs
+""")
+
+SAMPLE_BET_DIFFS_SQL = text("""
+    SELECT id AS bet_id, user_id, match_id, actual_points, expected_points
+    FROM bet_diffs
+    ORDER BY id
+    LIMIT :limit
+""")
+
+SAMPLE_USER_DIFFS_SQL = text(f"""
+    SELECT id,
+           username,
+           actual_score,
+           expected_score,
+           actual_correct_results,
+           expected_correct_results,
+           actual_lone_wolf_victories,
+           expected_lone_wolf_victories,
+           actual_defeats,
+           expected_defeats
+    FROM expected_users
+    WHERE {USER_DIFF_CONDITION}
+    ORDER BY id
+    LIMIT :limit
+""")
+
+REPAIR_LEDGER_SQL = text("""
+    INSERT INTO score_events (user_id, match_id, stage_id, delta, created_at)
+    SELECT d.user_id, d.match_id, m.stage_id, d.delta, :now
+    FROM ledger_diffs AS d
+    JOIN matches AS m ON m.id = d.match_id
+""")
+
+REPAIR_BETS_SQL = text("""
+    UPDATE bets AS b
+    SET points_awarded = d.expected_points,
+        updated_at = :now
+    FROM bet_diffs AS d
+    WHERE b.id = d.id
+""")
+
+REPAIR_USERS_SQL = text(f"""
+    UPDATE users AS u
+    SET score = e.expected_score,
+        correct_results = e.expected_correct_results,
+        lone_wolf_victories = e.expected_lone_wolf_victories,
+        defeats = e.expected_defeats,
+        updated_at = :now
+    FROM expected_users AS e
+    WHERE u.id = e.id
+      AND {USER_DIFF_CONDITION}
+""")
+
+# Recomputes the stage aggregates of the (user, stage) pairs whose bets were
+# repaired, like INSERT_STAGE_POINTS_SQL does for whole stages. The exact hits
+# per match come from match_exact_hits, so no other user's bets are read.
+REPAIR_STAGE_POINTS_SQL = text(f"""
+    WITH repaired AS (
+        SELECT DISTINCT user_id, stage_id
+        FROM bet_diffs
+    ),
+    totals AS (
+        SELECT r.user_id,
+               r.stage_id,
+               SUM(b.points_awarded) AS points,
+               COUNT(*) FILTER (WHERE {IS_EXACT}) AS exact_hits,
+               COUNT(*) FILTER (WHERE {IS_EXACT} AND h.exact_hits = 1) AS lone_wolves,
+               COUNT(*) FILTER (WHERE b.points_awarded = 0) AS defeats
+        FROM repaired AS r
+        JOIN matches AS m ON m.stage_id = r.stage_id
+        JOIN bets AS b ON b.user_id = r.user_id AND b.match_id = m.id
+        LEFT JOIN match_exact_hits AS h ON h.match_id = m.id
+        WHERE m.home_score IS NOT NULL
+          AND m.away_score IS NOT NULL
+        GROUP BY r.user_id, r.stage_id
+    )
+    INSERT INTO user_stage_points AS p (user_id, stage_id, points, exact_hits, lone_wolves, defeats)
+    SELECT user_id, stage_id, points, exact_hits, lone_wolves, defeats
+    FROM totals
+    ON CONFLICT (user_id, stage_id) DO UPDATE
+    SET points = EXCLUDED.points,
+        exact_hits = EXCLUDED.exact_hits,
+        lone_wolves = EXCLUDED.lone_wolves,
+        defeats = EXCLUDED.defeats
+""")
+
+REPAIRED_MATCHES_SQL = text("SELECT DISTINCT match_id FROM bet_diffs")
+
+
+def reconcile(session: Session, repair: bool = False) -> Dict:
+    """
+    Recompute every bet's points and every user's score and tie-breaking stats
+    from the match results, and report where the stored values differ.
+
+    Everything runs set-based in one transaction: two aggregates over the
+    bets and one over the ledger, after which only the users with differences
+    are looked at bet by bet. With repair=True the differences are written back (bets,
+    users and compensating ledger entries) and committed, the stage
+    aggregates of the repaired bets are recomputed and rank snapshots are
+    refreshed from the earliest stage they touch; otherwise the transaction is
+    rolled back. A repair raises SettlementInProgress while settlement jobs
+    will still run; failed jobs and the jobs queued behind them are marked
+    superseded.
+    """
+    now = datetime.now()
+    try:
+        if repair:
+            # A queued job settles relative to the result it replaced, so repairing
+            # before it runs would make the job award its points a second time
+            session.execute(LOCK_SETTLEMENT_JOBS_SQL)
+            unfinished_jobs = session.execute(UNFINISHED_JOBS_SQL).scalar()
+            if unfinished_jobs:
+                raise SettlementInProgress(
+                    f"{unfinished_jobs} settlement jobs are still queued or running, retry once they finish"
+                )
+
+        session.execute(BET_TOTALS_SQL)
+        session.execute(MATCH_EXACT_HITS_SQL)
+        session.execute(EXPECTED_USERS_SQL)
+        session.execute(ANALYZE_EXPECTED_USERS_SQL)
+        session.execute(BET_DIFFS_SQL)
+        session.execute(LEDGER_DIFFS_SQL)
+        counts = session.execute(COUNT_DIFFS_SQL).mappings().one()
+        report = {
+            **counts,
+            "bet_diff_samples": [
+                dict(row) for row in session.execute(SAMPLE_BET_DIFFS_SQL, {"limit": RECONCILE_SAMPLE_SIZE}).mappings()
+            ],
+            "user_diff_samples": [
+                dict(row) for row in session.execute(SAMPLE_USER_DIFFS_SQL, {"limit": RECONCILE_SAMPLE_SIZE}).mappings()
+            ],
+            "repaired": False,
+        }
+        superseded_jobs = 0
+        if repair:
+            superseded_jobs = session.execute(SUPERSEDE_JOBS_SQL, {"now": now}).rowcount
+            report["superseded_jobs"] = superseded_jobs
+
+        if repair and (counts["bet_diffs"] or counts["user_diffs"] or counts["ledger_diffs"]):
+            session.execute(REPAIR_LEDGER_SQL, {"now": now})
+            session.execute(REPAIR_USERS_SQL, {"now": now})
+            if counts["bet_diffs"]:
+                session.execute(REPAIR_BETS_SQL, {"now": now})
+                session.execute(REPAIR_STAGE_POINTS_SQL)
+                refresh_rank_snapshots(session, session.execute(REPAIRED_MATCHES_SQL).scalars().all(), now)
+            session.commit()
+            report["repaired"] = True
+        elif superseded_jobs:
+            session.commit()
+        else:
+            session.rollback()
+    except Exception:
+        session.rollback()
+        raise
+
+    return report
@@ -0,0 +1,42 @@
+# Scoring system:
+# - Exact score match: 3 points
+# - Correct result (win/draw/loss): 1 point
+# - Wrong result: 0 points
+EXACT_SCORE_POINTS = 3
+CORRECT_RESULT_POINTS = 1
+WRONG_RESULT_POINTS = 0
+
+
+def _sign(value: int) -> int:
+    return (value > 0) - (value < 0)
+
+
+def calculate_bet_points(home_prediction: int, away_prediction: int, home_actual: int, away_actual: int) -> int:
+    """
+    Calculate points awarded for a bet based on the prediction vs actual result.
+
+    The result (home win / draw / away win) is the sign of the goal difference,
+    so a correct result is a matching sign.
+    """
+    if home_prediction == home_actual and away_prediction == away_actual:
+        return EXACT_SCORE_POINTS
+    if _sign(home_prediction - away_prediction) == _sign(home_actual - away_actual):
+        return CORRECT_RESULT_POINTS
+    return WRONG_RESULT_POINTS
+
+
+def bet_points_sql(home_prediction: str, away_prediction: str, home_actual: str, away_actual: str) -> str:
+    """
+    SQL expression applying the same rules to whole sets of bets.
+
+    Arguments are SQL expressions (column names or casted parameters). This is
+    what settlement and reconciliation run, so every scoring path shares the
+    rules above.
+    """
+    return (
+        f"CASE WHEN {home_prediction} = {home_actual} AND {away_prediction} = {away_actual} "
+        f"THEN {EXACT_SCORE_POINTS} "
+        f"WHEN sign({home_prediction} - {away_prediction}) = sign({home_actual} - {away_actual}) "
+        f"THEN {CORRECT_RESULT_POINTS} "
+        f"ELSE {WRONG_RESULT_POINTS} END"
+    )
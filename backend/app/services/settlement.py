@@ -0,0 +1,273 @@
+import time
+from datetime import datetime
+from sqlalchemy import text
+from sqlmodel import Session
+from typing import Dict, List, Optional, Tuple
+from app.models.match import Match
+from app.services.leaderboard_cache import leaderboard_cache
+from app.services.rank_snapshots import refresh_rank_snapshots
+from app.services.scoring import bet_points_sql
+from app.services.stage_points import apply_match_stage_points, rebuild_stage_points
+from app.services.tie_breaking import apply_match_tie_breaking_stats, recompute_all_users_tie_breaking_stats
+from app.services.user_cache import user_cache
+
+
+# Scores every bet of the given matches and applies the per-user score deltas
+# in a single statement. On corrections the previously awarded points are
+# subtracted before the new ones are added, mirroring the old per-row logic.
+# Every non-zero delta is also appended to the score_events ledger, so a
+# correction shows up there as a compensating entry.
+SETTLE_MATCHES_SQL = text(f"""
+    WITH results AS (
+        SELECT *
+        FROM unnest(
+            CAST(:match_ids AS integer[]),
+            CAST(:home_scores AS integer[]),
+            CAST(:away_scores AS integer[]),
+            CAST(:corrections AS boolean[])
+        ) AS r(match_id, home_score, away_score, is_correction)
+    ),
+    previous AS (
+        SELECT b.id, b.points_awarded AS old_points, r.home_score, r.away_score, r.is_correction
+        FROM bets AS b
+        JOIN results AS r ON r.match_id = b.match_id
+        FOR UPDATE OF b
+    ),
+    scored AS (
+        UPDATE bets AS b
+        SET points_awarded = {bet_points_sql(
+                "b.home_score_prediction", "b.away_score_prediction", "p.home_score", "p.away_score"
+            )},
+            updated_at = :now
+        FROM previous AS p
+        WHERE b.id = p.id
+        RETURNING b.user_id, b.match_id, b.points_awarded,
+                  b.points_awarded - CASE WHEN p.is_correction THEN p.old_points ELSE 0 END AS delta
+    ),
+    deltas AS (
+        SELECT user_id, SUM(delta) AS delta
+        FROM scored
+        GROUP BY user_id
+    ),
+    users_updated AS (
+        UPDATE users AS u
+        SET score = u.score + d.delta,
+            updated_at = :now
+        FROM deltas AS d
+        WHERE u.id = d.user_id
+        RETURNING u.id
+    ),
+    ledger AS (
+        INSERT INTO score_events (user_id, match_id, stage_id, delta, created_at)
+        SELECT s.user_id, s.match_id, m.stage_id, s.delta, :now
+        FROM scored AS s
+        JOIN matches AS m ON m.id = s.match_id
+        WHERE s.delta <> 0
+        RETURNING id
+    )
+    SELECT r.match_id,
+           COUNT(s.match_id) AS bets_settled,
+           COALESCE(SUM(s.points_awarded), 0) AS points_awarded,
+           COALESCE(SUM(s.delta), 0) AS score_delta,
+           (SELECT COUNT(*) FROM users_updated) AS users_updated
+    FROM results AS r
+    LEFT JOIN scored AS s ON s.match_id = r.match_id
+    GROUP BY r.match_id
+""")
+
+# (match_id, home_score, away_score, is_correction)
+MatchResult = Tuple[int, int, int, bool]
+
+
+def settle_matches_bets(session: Session, results: List[MatchResult], now: datetime) -> Dict:
+    """
+    Award points for every bet of the given matches and update the bettors' scores.
+
+    Everything happens in one round trip, so the cost no longer depends on
+    loading bets or users into the ORM. Returns a settlement summary:
+    - matches: Per match id, bets_settled, points_awarded (total now held by
+      the match's bets) and score_delta (net change applied to users' scores)
+    - users_updated: Number of users whose score row was updated
+    """
+    if not results:
+        return {"matches": {}, "users_updated": 0}
+
+    rows = session.execute(
+        SETTLE_MATCHES_SQL,
+        {
+            "match_ids": [result[0] for result in results],
+            "home_scores": [result[1] for result in results],
+            "away_scores": [result[2] for result in results],
+            "corrections": [result[3] for result in results],
+            "now": now,
+        },
+    ).all()
+
+    return {
+        "matches": {
+            row.match_id: {
+                "bets_settled": row.bets_settled,
+                "points_awarded": row.points_awarded,
+                "score_delta": row.score_delta,
+            }
+            for row in rows
+        },
+        "users_updated": rows[0].users_updated if rows else 0,
+    }
+
+
+def settle_match_bets(
+    session: Session,
+    match_id: int,
+    home_score: int,
+    away_score: int,
+    is_correction: bool,
+    now: datetime,
+) -> Dict[str, int]:
+    """Settle a single match's bets, see settle_matches_bets"""
+    summary = settle_matches_bets(session, [(match_id, home_score, away_score, is_correction)], now)
+    return {**summary["matches"][match_id], "users_updated": summary["users_updated"]}
+
+
+def _classify(
+    previous_home_score: Optional[int],
+    previous_away_score: Optional[int],
+    home_score: int,
+    away_score: int,
+) -> Tuple[bool, bool]:
+    """Return (is_first_time_scoring, is_score_update) for a new result"""
+    is_first_time_scoring = previous_home_score is None and previous_away_score is None
+    is_score_update = not is_first_time_scoring and (
+        previous_home_score != home_score or previous_away_score != away_score
+    )
+    return is_first_time_scoring, is_score_update
+
+
+def settle_result(
+    session: Session,
+    match_id: int,
+    home_score: int,
+    away_score: int,
+    previous_home_score: Optional[int],
+    previous_away_score: Optional[int],
+    now: datetime,
+) -> Optional[Dict[str, int]]:
+    """
+    Settle a match's bets for a result replacing the previous one, without committing.
+
+    Tie-breaking stats and per-stage aggregates are updated incrementally for
+    the match's bettors, and rank snapshots refreshed once its stage is done.
+    Returns the settlement summary, or None when the result is unchanged and
+    nothing had to be settled.
+    """
+    is_first_time_scoring, is_score_update = _classify(previous_home_score, previous_away_score, home_score, away_score)
+    if not (is_first_time_scoring or is_score_update):
+        return None
+
+    # Remove the old result's contributions while bets still hold the old points
+    if is_score_update:
+        apply_match_tie_breaking_stats(session, match_id, previous_home_score, previous_away_score, sign=-1)
+        apply_match_stage_points(session, match_id, previous_home_score, previous_away_score, sign=-1)
+
+    summary = settle_match_bets(
+        session,
+        match_id,
+        home_score,
+        away_score,
+        is_correction=is_score_update,
+        now=now,
+    )
+
+    # Update tie-breaking statistics of this match's bettors only
+    apply_match_tie_breaking_stats(session, match_id, home_score, away_score)
+    apply_match_stage_points(session, match_id, home_score, away_score)
+    refresh_rank_snapshots(session, [match_id], now)
+    return summary
+
+
+def record_result(match: Match, home_score: int, away_score: int) -> Tuple[Optional[int], Optional[int]]:
+    """Store a new result on the match and return the previous one"""
+    previous = (match.home_score, match.away_score)
+    match.home_score = home_score
+    match.away_score = away_score
+    match.updated_at = datetime.now()
+    return previous
+
+
+def settle_match(session: Session, match: Match, home_score: int, away_score: int) -> Optional[Dict[str, int]]:
+    """Record a match result and settle its bets right away, without committing"""
+    # Re-read under a row lock, so an overlapping settlement's result counts as the previous one
+    session.refresh(match, with_for_update=True)
+    previous_home_score, previous_away_score = record_result(match, home_score, away_score)
+    session.add(match)
+    # Settlement is raw SQL, which does not autoflush: it must see the new result
+    session.flush()
+    return settle_result(
+        session, match.id, home_score, away_score, previous_home_score, previous_away_score, match.updated_at
+    )
+
+
+def settle_matchday(session: Session, results: List[Tuple[Match, int, int]]) -> Dict:
+    """
+    Record many match results and settle all of their bets, without committing.
+
+    Bets of every changed match are scored and the aggregated user score
+    deltas applied in one statement; tie-breaking stats are then recomputed
+    once for everybody, the aggregates of the affected stages rebuilt and
+    their rank snapshots refreshed. Returns per-match statuses and counts plus timings.
+    """
+    now = datetime.now()
+    statuses = {}
+    to_settle: List[MatchResult] = []
+    stage_ids = set()
+    for match, home_score, away_score in results:
+        is_first_time_scoring, is_score_update = _classify(match.home_score, match.away_score, home_score, away_score)
+        if is_first_time_scoring:
+            statuses[match.id] = "settled"
+        elif is_score_update:
+            statuses[match.id] = "corrected"
+        else:
+            statuses[match.id] = "unchanged"
+
+        match.home_score = home_score
+        match.away_score = away_score
+        match.updated_at = now
+        session.add(match)
+        if is_first_time_scoring or is_score_update:
+            to_settle.append((match.id, home_score, away_score, is_score_update))
+            stage_ids.add(match.stage_id)
+
+    # The rest is raw SQL, which does not autoflush: it must see the new results
+    session.flush()
+
+    started = time.perf_counter()
+    summary = settle_matches_bets(session, to_settle, now)
+    settled = time.perf_counter()
+    if to_settle:
+        recompute_all_users_tie_breaking_stats(session)
+    tie_broken = time.perf_counter()
+    if stage_ids:
+        rebuild_stage_points(session, sorted(stage_ids))
+        refresh_rank_snapshots(session, [result[0] for result in to_settle], now)
+    finished = time.perf_counter()
+
+    empty = {"bets_settled": 0, "points_awarded": 0, "score_delta": 0}
+    return {
+        "matches": [
+            {"match_id": match_id, "status": match_status, **summary["matches"].get(match_id, empty)}
+            for match_id, match_status in statuses.items()
+        ],
+        "users_updated": summary["users_updated"],
+        "timings_ms": {
+            "settlement": round((settled - started) * 1000, 3),
+            "tie_breaking": round((tie_broken - settled) * 1000, 3),
+            "stage_standings": round((finished - tie_broken) * 1000, 3),
+        },
+    }
+
+
+def invalidate_score_caches() -> None:
+    """Drop the caches holding scores after a settlement was committed"""
+    # Cached users carry their score
+    user_cache.clear()
+    leaderboard_cache.invalidate()
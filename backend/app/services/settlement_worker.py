@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import text
+from sqlmodel import Session, select
+from app.db import engine
+from app.models.match import Match
+from app.models.settlement import SettlementJob
+from app.services.live_updates import publish_score_update
+from app.services.settlement import invalidate_score_caches, record_result, settle_result
+
+logger = logging.getLogger(__name__)
+
+# How often the worker looks for jobs when it was not woken up explicitly
+SETTLEMENT_POLL_SECONDS = float(os.getenv("SETTLEMENT_POLL_SECONDS", "5"))
+# A running job older than this is assumed to belong to a dead worker
+SETTLEMENT_JOB_TIMEOUT_SECONDS = float(os.getenv("SETTLEMENT_JOB_TIMEOUT_SECONDS", "300"))
+SETTLEMENT_MAX_ATTEMPTS = int(os.getenv("SETTLEMENT_MAX_ATTEMPTS", "3"))
+# Wait before retrying a failed attempt, doubled after each further failure
+SETTLEMENT_RETRY_DELAY_SECONDS = float(os.getenv("SETTLEMENT_RETRY_DELAY_SECONDS", "15"))
+
+# Jobs that keep a match's later results from being settled. A failed job
+# left its result recorded but unsettled, so the jobs after it would settle
+# against a result the bets never got; it blocks the match until
+# reconcile --repair resolves it.
+BLOCKING_STATUSES = ("pending", "running", "failed")
+
+# Oldest claimable job. Jobs of the same match run in order, so a job waits
+# while an earlier one for its match is unfinished or failed. A job whose
+# attempt failed is not claimed again before its retry delay has passed.
+CLAIM_JOB_SQL = text("""
+    SELECT j.id
+    FROM settlement_jobs AS j
+    WHERE ((j.status = 'pending' AND j.available_at <= :now)
+           OR (j.status = 'running' AND j.started_at < :stale_before))
+      AND NOT EXISTS (
+          SELECT 1
+          FROM settlement_jobs AS e
+          WHERE e.match_id = j.match_id
+            AND e.id < j.id
+            AND e.status IN ('pending', 'running', 'failed')
+      )
+    ORDER BY j.id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+""")
+
+
+def enqueue_settlement(session: Session, match: Match, home_score: int, away_score: int) -> Optional[SettlementJob]:
+    """
+    Record a match result and queue the settlement of its bets, without committing.
+
+    The job keeps the result it replaces, so it can be settled later exactly
+    as it would have been right away. The match is re-read under a row lock
+    first, so two overlapping submissions queue one job and a correction,
+    never two first-time jobs. Returns None when the result is unchanged and
+    there is nothing to settle.
+    """
+    session.refresh(match, with_for_update=True)
+    previous_home_score, previous_away_score = record_result(match, home_score, away_score)
+    session.add(match)
+    if (previous_home_score, previous_away_score) == (home_score, away_score):
+        return None
+
+    job = SettlementJob(
+        match_id=match.id,
+        home_score=home_score,
+        away_score=away_score,
+        previous_home_score=previous_home_score,
+        previous_away_score=previous_away_score,
+    )
+    session.add(job)
+    return job
+
+
+def has_unfinished_jobs(session: Session, match_ids: list) -> bool:
+    """Whether any of the matches has a settlement queued, running or failed"""
+    statement = select(SettlementJob.id).where(
+        SettlementJob.match_id.in_(match_ids),
+        SettlementJob.status.in_(BLOCKING_STATUSES),
+    )
+    return session.exec(statement.limit(1)).first() is not None
+
+
+def _claim_job() -> Optional[int]:
+    """Mark the next job as running in its own transaction so progress is visible"""
+    with Session(engine) as session:
+        now = datetime.now()
+        stale_before = now - timedelta(seconds=SETTLEMENT_JOB_TIMEOUT_SECONDS)
+        job_id = session.execute(CLAIM_JOB_SQL, {"now": now, "stale_before": stale_before}).scalar()
+        if job_id is None:
+            return None
+        job = session.get(SettlementJob, job_id)
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = datetime.now()
+        session.add(job)
+        session.commit()
+        return job_id
+
+
+def process_next_job() -> bool:
+    """
+    Settle the next queued job. Returns False when no job is ready to run.
+
+    The settlement and the job's completion commit in one transaction, so a
+    crash leaves the job unfinished with no points awarded, and a job already
+    marked done is never settled twice.
+    """
+    job_id = _claim_job()
+    if job_id is None:
+        return False
+
+    try:
+        with Session(engine) as session:
+            job = session.exec(select(SettlementJob).where(SettlementJob.id == job_id).with_for_update()).first()
+            if job is None or job.status != "running":
+                return True
+
+            match_id = job.match_id
+            summary = settle_result(
+                session,
+                job.match_id,
+                job.home_score,
+                job.away_score,
+                job.previous_home_score,
+                job.previous_away_score,
+                datetime.now(),
+            ) or {"bets_settled": 0, "users_updated": 0}
+            job.status = "done"
+            job.bets_settled = summary["bets_settled"]
+            job.users_updated = summary["users_updated"]
+            job.error = None
+            job.finished_at = datetime.now()
+            session.add(job)
+            session.commit()
+    except Exception as e:
+        logger.exception("Settlement job %s failed", job_id)
+        with Session(engine) as session:
+            job = session.get(SettlementJob, job_id)
+            if job is not None and job.status == "running":
+                job.status = "pending" if job.attempts < SETTLEMENT_MAX_ATTEMPTS else "failed"
+                job.error = str(e)
+                job.finished_at = datetime.now() if job.status == "failed" else None
+                # A transient error gets time to clear before the next attempt
+                retry_delay = SETTLEMENT_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+                job.available_at = datetime.now() + timedelta(seconds=retry_delay)
+                session.add(job)
+                session.commit()
+        return True
+
+    invalidate_score_caches()
+    publish_score_update([match_id])
+    return True
+
+
+class SettlementWorker:
+    """In-process asyncio worker draining the settlement_jobs table"""
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        """Wake the worker up; safe to call from any thread"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Settlement is blocking database work, keep it off the event loop
+                while await asyncio.to_thread(process_next_job):
+                    pass
+            except Exception:
+                logger.exception("Settlement worker iteration failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+settlement_worker = SettlementWorker(SETTLEMENT_POLL_SECONDS)
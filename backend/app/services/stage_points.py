@@ -0,0 +1,122 @@
+from typing import List, Optional
+from sqlalchemy import text
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.stage_points import StageLeaderboardEntry
+
+# Adds (sign=1) or removes (sign=-1) one match's contribution to its stage's
+# aggregates, for the users who bet on it. Mirrors the incremental
+# tie-breaking update, plus the points themselves.
+APPLY_MATCH_STAGE_POINTS_SQL = text("""
+    WITH exact_hits AS (
+        SELECT COUNT(*) AS hits
+        FROM bets
+        WHERE match_id = :match_id
+          AND home_score_prediction = :home_score
+          AND away_score_prediction = :away_score
+    ),
+    contributions AS (
+        SELECT b.user_id,
+               b.points_awarded AS points,
+               CASE WHEN b.home_score_prediction = :home_score
+                         AND b.away_score_prediction = :away_score THEN 1 ELSE 0 END AS exact_hit,
+               CASE WHEN b.home_score_prediction = :home_score
+                         AND b.away_score_prediction = :away_score
+                         AND e.hits = 1 THEN 1 ELSE 0 END AS lone_wolf,
+               CASE WHEN b.points_awarded = 0 THEN 1 ELSE 0 END AS defeat
+        FROM bets AS b
+        CROSS JOIN exact_hits AS e
+        WHERE b.match_id = :match_id
+    )
+    INSERT INTO user_stage_points AS p (user_id, stage_id, points, exact_hits, lone_wolves, defeats)
+    SELECT c.user_id, m.stage_id,
+           :sign * c.points, :sign * c.exact_hit, :sign * c.lone_wolf, :sign * c.defeat
+    FROM contributions AS c
+    JOIN matches AS m ON m.id = :match_id
+    ON CONFLICT (user_id, stage_id) DO UPDATE
+    SET points = p.points + EXCLUDED.points,
+        exact_hits = p.exact_hits + EXCLUDED.exact_hits,
+        lone_wolves = p.lone_wolves + EXCLUDED.lone_wolves,
+        defeats = p.defeats + EXCLUDED.defeats
+""")
+
+# Recomputes the aggregates of whole stages from their settled bets
+DELETE_STAGE_POINTS_SQL = text("""
+    DELETE FROM user_stage_points
+    WHERE CAST(:stage_ids AS integer[]) IS NULL OR stage_id = ANY(CAST(:stage_ids AS integer[]))
+""")
+
+INSERT_STAGE_POINTS_SQL = text("""
+    WITH settled_bets AS (
+        SELECT b.user_id,
+               m.stage_id,
+               b.points_awarded,
+               (b.home_score_prediction = m.home_score
+                AND b.away_score_prediction = m.away_score) AS is_exact,
+               COUNT(*) FILTER (
+                   WHERE b.home_score_prediction = m.home_score
+                     AND b.away_score_prediction = m.away_score
+               ) OVER (PARTITION BY b.match_id) AS exact_hits
+        FROM bets AS b
+        JOIN matches AS m ON m.id = b.match_id
+        WHERE m.home_score IS NOT NULL
+          AND m.away_score IS NOT NULL
+          AND (CAST(:stage_ids AS integer[]) IS NULL OR m.stage_id = ANY(CAST(:stage_ids AS integer[])))
+    )
+    INSERT INTO user_stage_points (user_id, stage_id, points, exact_hits, lone_wolves, defeats)
+    SELECT user_id,
+           stage_id,
+           SUM(points_awarded),
+           COUNT(*) FILTER (WHERE is_exact),
+           COUNT(*) FILTER (WHERE is_exact AND exact_hits = 1),
+           COUNT(*) FILTER (WHERE points_awarded = 0)
+    FROM settled_bets
+    GROUP BY user_id, stage_id
+""")
+
+# Served by ix_user_stage_points_leaderboard
+STAGE_LEADERBOARD_SQL = text("""
+    SELECT u.id, u.username, p.points, p.exact_hits, p.lone_wolves, p.defeats,
+           RANK() OVER (ORDER BY p.points DESC, p.exact_hits DESC, p.lone_wolves DESC, p.defeats ASC) AS rank
+    FROM user_stage_points AS p
+    JOIN users AS u ON u.id = p.user_id
+    WHERE p.stage_id = :stage_id
+    ORDER BY p.points DESC, p.exact_hits DESC, p.lone_wolves DESC, p.defeats ASC, p.user_id ASC
+    LIMIT :limit
+""")
+
+
+def apply_match_stage_points(
+    session: Session,
+    match_id: int,
+    home_score: int,
+    away_score: int,
+    sign: int = 1,
+) -> int:
+    """
+    Incrementally add or remove a single match's contribution to its stage's
+    aggregates, the same way apply_match_tie_breaking_stats does for users.
+    Returns the number of rows touched.
+    """
+    result = session.execute(
+        APPLY_MATCH_STAGE_POINTS_SQL,
+        {
+            "match_id": match_id,
+            "home_score": home_score,
+            "away_score": away_score,
+            "sign": sign,
+        },
+    )
+    return result.rowcount
+
+
+def rebuild_stage_points(session: Session, stage_ids: Optional[List[int]] = None) -> None:
+    """Recompute the aggregates of the given stages (all when None) from scratch, without committing"""
+    params = {"stage_ids": stage_ids}
+    session.execute(DELETE_STAGE_POINTS_SQL, params)
+    session.execute(INSERT_STAGE_POINTS_SQL, params)
+
+
+async def get_stage_leaderboard(session: AsyncSession, stage_id: int, limit: int) -> List[StageLeaderboardEntry]:
+    rows = (await session.execute(STAGE_LEADERBOARD_SQL, {"stage_id": stage_id, "limit": limit})).mappings().all()
+    return [StageLeaderboardEntry(**row) for row in rows]
@@ -1,3 +1,4 @@
+from sqlalchemy import text
 from sqlmodel import Session, select
 from typing import Dict, List, Tuple
 from app.models.user import User
@@ -73,15 +74,119 @@ def update_user_tie_breaking_stats(session: Session, user_id: int) -> None:
         session.commit()
 
 
+# Computes the three tie-breaking stats of every user in one pass over the
+# bets of settled matches and writes them back in the same statement. Users
+# without settled bets are reset to zero, like the per-user calculation does.
+ALL_USERS_TIE_BREAKING_SQL = text("""
+    WITH settled_bets AS (
+        SELECT b.user_id,
+               b.points_awarded,
+               (b.home_score_prediction = m.home_score
+                AND b.away_score_prediction = m.away_score) AS is_correct,
+               COUNT(*) FILTER (
+                   WHERE b.home_score_prediction = m.home_score
+                     AND b.away_score_prediction = m.away_score
+               ) OVER (PARTITION BY b.match_id) AS exact_hits
+        FROM bets AS b
+        JOIN matches AS m ON m.id = b.match_id
+        WHERE m.home_score IS NOT NULL
+          AND m.away_score IS NOT NULL
+    ),
+    stats AS (
+        SELECT user_id,
+               COUNT(*) FILTER (WHERE is_correct) AS correct_results,
+               COUNT(*) FILTER (WHERE is_correct AND exact_hits = 1) AS lone_wolf_victories,
+               COUNT(*) FILTER (WHERE points_awarded = 0) AS defeats
+        FROM settled_bets
+        GROUP BY user_id
+    ),
+    target AS (
+        SELECT u.id,
+               COALESCE(s.correct_results, 0) AS correct_results,
+               COALESCE(s.lone_wolf_victories, 0) AS lone_wolf_victories,
+               COALESCE(s.defeats, 0) AS defeats
+        FROM users AS u
+        LEFT JOIN stats AS s ON s.user_id = u.id
+    )
+    UPDATE users AS u
+    SET correct_results = t.correct_results,
+        lone_wolf_victories = t.lone_wolf_victories,
+        defeats = t.defeats
+    FROM target AS t
+    WHERE u.id = t.id
+      AND (u.correct_results, u.lone_wolf_victories, u.defeats)
+          IS DISTINCT FROM (t.correct_results, t.lone_wolf_victories, t.defeats)
+""")
+
+
+def recompute_all_users_tie_breaking_stats(session: Session) -> None:
+    """Recompute tie-breaking statistics for all users in a single SQL pass, without committing"""
+    session.execute(ALL_USERS_TIE_BREAKING_SQL)
+
+
 def update_all_users_tie_breaking_stats(session: Session) -> None:
-    """Update tie-breaking statistics for all users"""
-    users = session.exec(select(User)).all()
-    
-    for user in users:
-        stats = calculate_tie_breaking_stats(session, user.id)
-        user.correct_results = stats["correct_results"]
-        user.lone_wolf_victories = stats["lone_wolf_victories"]
-        user.defeats = stats["defeats"]
-        session.add(user)
-    
+    """Update tie-breaking statistics for all users in a single SQL pass"""
+    recompute_all_users_tie_breaking_stats(session)
     session.commit()
+
+
+# Adds (sign=1) or removes (sign=-1) one match's contribution to the
+# tie-breaking stats of the users who bet on it. Bets are unique per user and
+# match, so each bettor gets at most one row.
+MATCH_TIE_BREAKING_SQL = text("""
+    WITH exact_hits AS (
+        SELECT COUNT(*) AS hits
+        FROM bets
+        WHERE match_id = :match_id
+          AND home_score_prediction = :home_score
+          AND away_score_prediction = :away_score
+    ),
+    contributions AS (
+        SELECT b.user_id,
+               CASE WHEN b.home_score_prediction = :home_score
+                         AND b.away_score_prediction = :away_score THEN 1 ELSE 0 END AS correct,
+               CASE WHEN b.home_score_prediction = :home_score
+                         AND b.away_score_prediction = :away_score
+                         AND e.hits = 1 THEN 1 ELSE 0 END AS lone_wolf,
+               CASE WHEN b.points_awarded = 0 THEN 1 ELSE 0 END AS defeat
+        FROM bets AS b
+        CROSS JOIN exact_hits AS e
+        WHERE b.match_id = :match_id
+    )
+    UPDATE users AS u
+    SET correct_results = u.correct_results + :sign * c.correct,
+        lone_wolf_victories = u.lone_wolf_victories + :sign * c.lone_wolf,
+        defeats = u.defeats + :sign * c.defeat
+    FROM contributions AS c
+    WHERE u.id = c.user_id
+      AND (c.correct <> 0 OR c.lone_wolf <> 0 OR c.defeat <> 0)
+""")
+
+
+def apply_match_tie_breaking_stats(
+    session: Session,
+    match_id: int,
+    home_score: int,
+    away_score: int,
+    sign: int = 1,
+) -> int:
+    """
+    Incrementally add or remove a single match's tie-breaking contribution.
+
+    Only the users who bet on the match are touched and lone wolf status is
+    derived for this match alone. Call it with sign=-1 and the previous result
+    before a correction re-scores the bets, then with sign=1 once the bets hold
+    their new points. Assumes the stored stats are in sync; use
+    update_all_users_tie_breaking_stats to resynchronise them.
+    Returns the number of users updated.
+    """
+    result = session.execute(
+        MATCH_TIE_BREAKING_SQL,
+        {
+            "match_id": match_id,
+            "home_score": home_score,
+            "away_score": away_score,
+            "sign": sign,
+        },
+    )
+    return result.rowcount
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from app import metrics
+from app.models.user import User
+
+# How long a validated user is trusted without going back to the database
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """Snapshot of the user fields request handlers read"""
+    id: int
+    username: str
+    phone: str
+    score: int
+    is_active: bool
+    is_superuser: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            phone=user.phone,
+            score=user.score,
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+        )
+
+
+class UserCache:
+    """
+    Per-process TTL cache of authenticated users keyed by user id.
+
+    Entries must be invalidated whenever a cached field changes: profile
+    updates, score settlement and deactivation.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[float, AuthenticatedUser]] = {}
+
+    def get(self, user_id: int) -> Optional[AuthenticatedUser]:
+        entry = self._entries.get(user_id)
+        if entry is not None and time.monotonic() < entry[0]:
+            metrics.increment("auth_user_cache_hits")
+            return entry[1]
+        metrics.increment("auth_user_cache_misses")
+        return None
+
+    def put(self, user: AuthenticatedUser) -> None:
+        with self._lock:
+            if user.id not in self._entries and len(self._entries) >= self.max_entries:
+                # Dicts keep insertion order, drop the oldest entry
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_MAX_ENTRIES)
@@ -0,0 +1,126 @@
+"""
+Kickoff rush: bet writes per second with and without the group-commit buffer.
+
+Simulates many bettors each placing one bet as fast as the API's request
+threads can take them, once committing every write on its own (what
+create_bet does by default) and once through a BetWriter. Run it against a
+scratch database, with the app's DB_* settings:
+
+    python -m benchmarks.bet_writes --bettors 5000 --threads 40
+
+Bettor users (bench_bettor_<n>) are created on first run and their bets
+are removed afterwards. Bets are stamped just before the earliest
+match's kickoff, so they are accepted whatever the seeded schedule.
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+for name, value in (("ADMIN_USERNAME", "admin"), ("ADMIN_PHONE", "910000000"), ("ADMIN_PASSWORD", "benchmark")):
+    os.environ.setdefault(name, value)
+
+from sqlalchemy import text  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+import app.main  # noqa: E402,F401  (registers every model)
+from app import metrics  # noqa: E402
+from app.db import engine  # noqa: E402
+from app.services.bet_writer import BetWriter  # noqa: E402
+from app.services.bets import upsert_bet  # noqa: E402
+
+
+def _setup(bettors: int):
+    """Bettor user ids, the match ids they bet on, and a submission time before every kickoff"""
+    with Session(engine) as session:
+        session.execute(
+            text("""
+                INSERT INTO users (username, phone, hashed_password)
+                SELECT 'bench_bettor_' || n, '8' || lpad(n::text, 8, '0'), 'x'
+                FROM generate_series(1, :bettors) AS n
+                ON CONFLICT DO NOTHING
+            """),
+            {"bettors": bettors},
+        )
+        session.commit()
+        user_ids = session.execute(
+            text("SELECT id FROM users WHERE username LIKE 'bench\\_bettor\\_%' ORDER BY id LIMIT :bettors"),
+            {"bettors": bettors},
+        ).scalars().all()
+        match_ids = session.execute(text("SELECT id FROM matches ORDER BY id")).scalars().all()
+        first_kickoff = session.execute(text("SELECT MIN(kickoff_at) FROM matches")).scalar()
+    if not match_ids:
+        raise SystemExit("No matches to bet on")
+    return user_ids, match_ids, first_kickoff - timedelta(minutes=1)
+
+
+def _clear_bets(user_ids) -> None:
+    with Session(engine) as session:
+        session.execute(text("DELETE FROM bets WHERE user_id = ANY(:user_ids)"), {"user_ids": list(user_ids)})
+        session.commit()
+
+
+def _direct_write(user_id: int, match_id: int, submitted_at) -> None:
+    with Session(engine) as session:
+        upsert_bet(session, user_id, match_id, 1, 0, submitted_at)
+        session.commit()
+
+
+def _run(label: str, write, user_ids, match_ids, submitted_at, threads: int) -> None:
+    latencies = []
+
+    def bettor(position: int) -> None:
+        started = time.perf_counter()
+        write(user_ids[position], match_ids[position % len(match_ids)], submitted_at)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(bettor, range(len(user_ids))))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{label:<9} {len(latencies) / elapsed:>8.0f} bets/s  "
+        f"p50 {statistics.median(latencies) * 1000:>6.1f}ms  p99 {p99 * 1000:>6.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bettors", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=40, help="Concurrent request threads (uvicorn's threadpool has 40)")
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    user_ids, match_ids, submitted_at = _setup(args.bettors)
+    try:
+        _clear_bets(user_ids)
+        _run("direct", _direct_write, user_ids, match_ids, submitted_at, args.threads)
+        _clear_bets(user_ids)
+
+        writer = BetWriter(args.max_batch, args.max_wait_ms, queue_limit=args.bettors)
+        writer.start()
+        try:
+            _run(
+                "buffered",
+                lambda user_id, match_id, at: writer.upsert(user_id, match_id, 1, 0, at),
+                user_ids,
+                match_ids,
+                submitted_at,
+                args.threads,
+            )
+        finally:
+            writer.stop()
+        batches = metrics.snapshot()["histograms"]["bet_write_batch_size"]
+        print(f"buffered: {batches['count']} batches, {batches['sum'] / batches['count']:.1f} bets per batch")
+    finally:
+        _clear_bets(user_ids)
+
+
+if __name__ == "__main__":
+    main()
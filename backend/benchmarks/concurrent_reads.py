@@ -0,0 +1,96 @@
+"""
+Requests per second of the hot read paths under concurrent clients.
+
+Drives a running API with many concurrent keep-alive clients cycling
+through authenticated read endpoints, and reports throughput and latency.
+Run it against one uvicorn worker of each build being compared, over the
+same database:
+
+    uvicorn app.main:app --workers 1 --port 8000
+    python -m benchmarks.concurrent_reads --url http://localhost:8000 --concurrency 64
+
+The token is minted with JWT_SECRET, which must match the server's.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import jwt
+
+DEFAULT_PATHS = (
+    "/api/auth/me",
+    "/api/stages/1/matches",
+    "/api/matches/1",
+    "/api/stages/1/bets?format=compact",
+)
+
+
+def _token(user_id: int) -> str:
+    now = int(time.time())
+    return jwt.encode({"sub": str(user_id), "iat": now, "exp": now + 3600}, os.environ["JWT_SECRET"], algorithm="HS256")
+
+
+async def _client(client: httpx.AsyncClient, paths, deadline: float, latencies: list, errors: list) -> None:
+    position = 0
+    while time.perf_counter() < deadline:
+        path = paths[position % len(paths)]
+        position += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+        except httpx.HTTPError as e:
+            errors.append(repr(e))
+            continue
+        if response.status_code != 200:
+            errors.append(f"{path}: {response.status_code}")
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def _run(url: str, paths, concurrency: int, seconds: float, user_id: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {_token(user_id)}"}
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30) as client:
+        # Warm the server's pools and caches before measuring
+        for path in paths:
+            try:
+                (await client.get(path)).raise_for_status()
+            except httpx.HTTPError as e:
+                sys.exit(f"Warm-up request to {path} failed: {e!r}")
+
+        latencies: list = []
+        errors: list = []
+        started = time.perf_counter()
+        deadline = started + seconds
+        await asyncio.gather(*(_client(client, paths, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"concurrency {concurrency}, {len(latencies)} requests in {elapsed:.1f}s, {len(errors)} errors")
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(
+            f"{len(latencies) / elapsed:.0f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms"
+        )
+    if errors:
+        print(f"first error: {errors[0]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", dest="paths", help="Endpoint to request, repeatable")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--user-id", type=int, default=1, help="User the token is minted for")
+    args = parser.parse_args()
+    asyncio.run(_run(args.url, args.paths or DEFAULT_PATHS, args.concurrency, args.seconds, args.user_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Reconciliation at league scale: report and repair times over a synthetic season.
+
+Fills the database with --users bettors who each bet on every one of
+--matches matches spread over --stages stages, settled the way settlement
+leaves them (points, ledger entries, user stats, stage aggregates and rank
+snapshots). The last stage is left unplayed. Then it times a clean report,
+drifts --drift bets, users and ledger entries, and times the report and the repair of that
+drift. The league tables of DB_NAME are wiped first, so point it at a
+scratch database migrated to head and confirm with --reset:
+
+    python -m benchmarks.reconcile --reset [--users 100000 --matches 1000 --stages 100 --drift 1000]
+
+Generating the target scale (100M bets) takes a while; --skip-setup reruns
+the timings against the data of a previous run.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+for name, value in (("ADMIN_USERNAME", "admin"), ("ADMIN_PHONE", "910000000"), ("ADMIN_PASSWORD", "benchmark")):
+    os.environ.setdefault(name, value)
+
+from sqlalchemy import text  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+import app.main  # noqa: E402,F401  (registers every model)
+from app.db import engine  # noqa: E402
+from app.services.rank_snapshots import rebuild_rank_snapshots  # noqa: E402
+from app.services.reconciliation import reconcile  # noqa: E402
+from app.services.scoring import bet_points_sql  # noqa: E402
+from app.services.stage_points import rebuild_stage_points  # noqa: E402
+from app.services.tie_breaking import recompute_all_users_tie_breaking_stats  # noqa: E402
+
+# Users are inserted and bet on in slices, so progress shows and no single
+# statement holds the whole season in memory
+USERS_PER_SLICE = 5_000
+
+TRUNCATE_SQL = text("""
+    TRUNCATE settlement_jobs, score_events, user_rank_snapshots, user_stage_points, bets, matches, stages, users
+    RESTART IDENTITY CASCADE
+""")
+
+INSERT_STAGES_SQL = text("""
+    INSERT INTO stages (name, date, created_at, updated_at)
+    SELECT 'Bench stage ' || s, TIMESTAMP '2025-08-01' + s * INTERVAL '7 days', now(), now()
+    FROM generate_series(1, CAST(:stages AS integer)) AS s
+""")
+
+# Matches are spread evenly over the stages; all but the last stage are played
+INSERT_MATCHES_SQL = text("""
+    INSERT INTO matches (home_team_id, away_team_id, stage_id, kickoff_at, home_score, away_score)
+    SELECT t.home_team_id,
+           t.away_team_id,
+           st.id,
+           st.date,
+           CASE WHEN st.id < :stages THEN (random() * 4)::int END,
+           CASE WHEN st.id < :stages THEN (random() * 3)::int END
+    FROM generate_series(0, CAST(:matches AS integer) - 1) AS m
+    JOIN stages AS st ON st.id = m * :stages / :matches + 1
+    CROSS JOIN LATERAL (
+        SELECT (SELECT id FROM teams ORDER BY id OFFSET m % 18 LIMIT 1) AS home_team_id,
+               (SELECT id FROM teams ORDER BY id OFFSET 18 + m % 18 LIMIT 1) AS away_team_id
+    ) AS t
+""")
+
+INSERT_USERS_SQL = text("""
+    INSERT INTO users (username, phone, hashed_password)
+    SELECT 'bench_' || u, 'bench_' || u, 'x'
+    FROM generate_series(CAST(:first AS integer), CAST(:last AS integer)) AS u
+""")
+
+# Bets are written in (user_id, match_id) order, as a season of sign-ups would roughly leave them
+INSERT_BETS_SQL = text(f"""
+    INSERT INTO bets (user_id, match_id, home_score_prediction, away_score_prediction, points_awarded)
+    SELECT p.user_id,
+           p.match_id,
+           p.home_prediction,
+           p.away_prediction,
+           CASE WHEN m.home_score IS NOT NULL
+                THEN {bet_points_sql("p.home_prediction", "p.away_prediction", "m.home_score", "m.away_score")}
+                ELSE 0 END
+    FROM (
+        SELECT u.id AS user_id, m.id AS match_id, (random() * 4)::int AS home_prediction, (random() * 3)::int AS away_prediction
+        FROM users AS u
+        CROSS JOIN matches AS m
+        WHERE u.id BETWEEN :first AND :last
+        ORDER BY u.id, m.id
+    ) AS p
+    JOIN matches AS m ON m.id = p.match_id
+""")
+
+INSERT_LEDGER_SQL = text("""
+    INSERT INTO score_events (user_id, match_id, stage_id, delta, created_at)
+    SELECT b.user_id, b.match_id, m.stage_id, b.points_awarded, m.kickoff_at
+    FROM bets AS b
+    JOIN matches AS m ON m.id = b.match_id
+    WHERE b.user_id BETWEEN :first AND :last
+      AND b.points_awarded <> 0
+    ORDER BY b.user_id, b.match_id
+""")
+
+# One user in ten carries an opening balance, like the users seeded before the ledger existed
+INSERT_OPENINGS_SQL = text("""
+    INSERT INTO score_events (user_id, match_id, stage_id, delta, created_at)
+    SELECT id, NULL, NULL, 5, TIMESTAMP '2025-08-01'
+    FROM users
+    WHERE id % 10 = 0
+""")
+
+UPDATE_SCORES_SQL = text("""
+    UPDATE users AS u
+    SET score = l.points
+    FROM (SELECT user_id, SUM(delta) AS points FROM score_events GROUP BY user_id) AS l
+    WHERE u.id = l.user_id
+""")
+
+# Flips the points of random bets, nudges the scores of random users and
+# loses random ledger entries
+DRIFT_BETS_SQL = text("""
+    UPDATE bets
+    SET points_awarded = 3 - points_awarded
+    WHERE id IN (
+        SELECT 1 + (random() * (SELECT MAX(id) - 1 FROM bets))::int
+        FROM generate_series(1, CAST(:drift AS integer))
+    )
+""")
+
+DRIFT_USERS_SQL = text("""
+    UPDATE users
+    SET score = score + 1
+    WHERE id IN (
+        SELECT 1 + (random() * (SELECT MAX(id) - 1 FROM users))::int
+        FROM generate_series(1, CAST(:drift AS integer))
+    )
+""")
+
+DRIFT_LEDGER_SQL = text("""
+    DELETE FROM score_events
+    WHERE id IN (
+        SELECT 1 + (random() * (SELECT MAX(id) - 1 FROM score_events))::int
+        FROM generate_series(1, CAST(:drift AS integer))
+    )
+      AND match_id IS NOT NULL
+""")
+
+
+def _step(label: str, started: float) -> float:
+    now = time.perf_counter()
+    print(f"  {label:<32} {now - started:>8.1f}s", flush=True)
+    return now
+
+
+def _setup(users: int, matches: int, stages: int) -> None:
+    started = time.perf_counter()
+    with Session(engine) as session:
+        session.execute(text("SET synchronous_commit = off"))
+        session.execute(TRUNCATE_SQL)
+        session.execute(INSERT_STAGES_SQL, {"stages": stages})
+        session.execute(INSERT_MATCHES_SQL, {"stages": stages, "matches": matches})
+        session.commit()
+        for first in range(1, users + 1, USERS_PER_SLICE):
+            params = {"first": first, "last": min(first + USERS_PER_SLICE - 1, users)}
+            session.execute(INSERT_USERS_SQL, params)
+            session.execute(INSERT_BETS_SQL, params)
+            session.execute(INSERT_LEDGER_SQL, params)
+            session.commit()
+            print(f"  bets of users {params['first']:,}-{params['last']:,}", flush=True)
+        started = _step("bets and ledger", started)
+        session.execute(INSERT_OPENINGS_SQL)
+        session.execute(UPDATE_SCORES_SQL)
+        recompute_all_users_tie_breaking_stats(session)
+        session.commit()
+        started = _step("users", started)
+        rebuild_stage_points(session)
+        session.commit()
+        started = _step("stage aggregates", started)
+        rebuild_rank_snapshots(session, datetime.now())
+        session.commit()
+        started = _step("rank snapshots", started)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE"))
+    _step("vacuum analyze", started)
+
+
+def _timed_reconcile(label: str, repair: bool = False) -> dict:
+    started = time.perf_counter()
+    with Session(engine) as session:
+        report = reconcile(session, repair=repair)
+    seconds = time.perf_counter() - started
+    print(
+        f"{label:<20} {seconds:>8.1f}s  bet_diffs={report['bet_diffs']:,} "
+        f"user_diffs={report['user_diffs']:,} ledger_diffs={report['ledger_diffs']:,}",
+        flush=True,
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--matches", type=int, default=1_000)
+    parser.add_argument("--stages", type=int, default=100)
+    parser.add_argument("--drift", type=int, default=1_000)
+    parser.add_argument("--reset", action="store_true", help="Confirm the league tables of DB_NAME may be wiped")
+    parser.add_argument("--skip-setup", action="store_true", help="Reuse the season of a previous run")
+    args = parser.parse_args()
+
+    if not args.skip_setup:
+        if not args.reset:
+            parser.error("this wipes the league tables of DB_NAME, pass --reset to confirm")
+        print(f"Generating {args.users:,} users x {args.matches:,} matches over {args.stages} stages")
+        _setup(args.users, args.matches, args.stages)
+
+    with Session(engine) as session:
+        bets = session.execute(text("SELECT COUNT(*) FROM bets")).scalar()
+    print(f"{bets:,} bets")
+
+    _timed_reconcile("report, clean")
+    with Session(engine) as session:
+        session.execute(DRIFT_BETS_SQL, {"drift": args.drift})
+        session.execute(DRIFT_USERS_SQL, {"drift": args.drift})
+        session.execute(DRIFT_LEDGER_SQL, {"drift": args.drift})
+        session.commit()
+    _timed_reconcile("report, drifted")
+    _timed_reconcile("repair", repair=True)
+    report = _timed_reconcile("report, repaired")
+    assert not (report["bet_diffs"] or report["user_diffs"] or report["ledger_diffs"]), report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Size and serialization time of the stage bets, JSON form against compact form.
+
+Builds a synthetic stage in memory (no database) and renders it through
+the same functions and response class GET /api/stages/{id}/bets uses.
+Sizes are reported raw and gzipped, since clients may not negotiate
+compression.
+
+    python -m benchmarks.stage_bets [--users 10000] [--matches 10]
+"""
+import argparse
+import gzip
+import os
+import time
+from datetime import datetime, timedelta
+
+# Importing the app builds its engines; nothing here connects to the database
+for name, value in (("DB_USER", "postgres"), ("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_NAME", "postgres")):
+    os.environ.setdefault(name, value)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import app.main  # noqa: E402,F401  (registers every model)
+from app.models.bet import Bet  # noqa: E402
+from app.models.match import Match  # noqa: E402
+from app.models.stage import Stage  # noqa: E402
+from app.models.team import Team  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.routers.stages import _compact_grid, _stage_bet_data  # noqa: E402
+
+
+def _synthetic_stage(users: int, matches: int):
+    """Every user bets on every match of a stage with two teams per match"""
+    kickoff = datetime(2026, 10, 18, 15, 0)
+    stage = Stage(id=1, name="Matchday 1", date=kickoff)
+    match_rows = []
+    for index in range(matches):
+        home = Team(id=2 * index + 1, name=f"Home Team {index}", logo_url=f"https://example.com/logos/{2 * index + 1}.png")
+        away = Team(id=2 * index + 2, name=f"Away Team {index}", logo_url=f"https://example.com/logos/{2 * index + 2}.png")
+        match = Match(
+            id=index + 1,
+            stage_id=stage.id,
+            home_team_id=home.id,
+            away_team_id=away.id,
+            kickoff_at=kickoff + timedelta(hours=index),
+            home_score=index % 4,
+            away_score=index % 3,
+        )
+        match_rows.append((match, home, away))
+
+    users_list = [User(id=user_id, username=f"bettor{user_id}", phone=f"9{user_id:08d}") for user_id in range(1, users + 1)]
+    json_rows = []
+    bet_rows = []
+    bet_id = 0
+    for user in users_list:
+        for match, home, away in match_rows:
+            bet_id += 1
+            bet = Bet(
+                id=bet_id,
+                user_id=user.id,
+                match_id=match.id,
+                home_score_prediction=(user.id + match.id) % 4,
+                away_score_prediction=(user.id * match.id) % 3,
+                points_awarded=(user.id + match.id) % 4 % 3,
+            )
+            json_rows.append((bet, user, match, home, away, stage))
+            bet_rows.append(
+                (user.id, user.username, match.id, bet.home_score_prediction, bet.away_score_prediction, bet.points_awarded)
+            )
+    return stage, match_rows, json_rows, bet_rows
+
+
+def _render(build, repeat: int):
+    """Best time of building and rendering the response body, and the body"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = JSONResponse(jsonable_encoder(build())).body
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--matches", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    stage, match_rows, json_rows, bet_rows = _synthetic_stage(args.users, args.matches)
+    forms = (
+        ("json", lambda: [_stage_bet_data(*row) for row in json_rows]),
+        ("compact", lambda: _compact_grid(stage, match_rows, bet_rows)),
+    )
+
+    print(f"{args.users} users x {args.matches} matches = {len(json_rows)} bets")
+    print(f"{'form':<8} {'bytes':>12} {'gzipped':>10} {'serialize':>11}")
+    for label, build in forms:
+        seconds, body = _render(build, args.repeat)
+        print(f"{label:<8} {len(body):>12,} {len(gzip.compress(body)):>10,} {seconds * 1000:>9.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Auth overhead per request with the verified-token cache on and off.
+
+Times decode_token alone and _authenticate (what get_current_user runs)
+with the user already in the user cache, so no database is involved and
+the difference is the HS256 verification the token cache skips.
+
+    python -m benchmarks.token_cache [--requests 200000]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-of-at-least-32-bytes")
+# Importing the app builds its engines; nothing here connects to the database
+for name, value in (("DB_USER", "postgres"), ("DB_HOST", "localhost"), ("DB_PORT", "5432"), ("DB_NAME", "postgres")):
+    os.environ.setdefault(name, value)
+
+from app import security  # noqa: E402
+from app.dependencies import _authenticate  # noqa: E402
+from app.services.user_cache import AuthenticatedUser, user_cache  # noqa: E402
+
+
+def _per_call_microseconds(fn, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def _authenticate_loop(token: str, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        await _authenticate(token, None)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args()
+
+    user = AuthenticatedUser(
+        id=1, username="benchmark", phone="910000000", score=0, is_active=True, is_superuser=False
+    )
+    user_cache.put(user)
+    token = security.create_access_token(str(user.id))
+    cache_size = security.TOKEN_CACHE_SIZE
+
+    print(f"{'token cache':<12} {'decode_token':>14} {'authenticate':>14}")
+    for label, size in (("off", 0), ("on", cache_size or 4096)):
+        security.TOKEN_CACHE_SIZE = size
+        security._token_cache.clear()
+        decode = _per_call_microseconds(lambda: security.decode_token(token), args.requests)
+        authenticate = asyncio.run(_authenticate_loop(token, args.requests))
+        print(f"{label:<12} {decode:>12.2f}us {authenticate:>12.2f}us")
+    security.TOKEN_CACHE_SIZE = cache_size
+
+
+if __name__ == "__main__":
+    main()
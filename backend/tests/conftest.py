@@ -0,0 +1,132 @@
+import os
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# The app reads its settings at import time, so it is pointed at a dedicated
+# test database before anything from app is imported. Tests get a fresh copy
+# of a migrated template database, which is built once per session.
+TEST_DB_NAME = os.getenv("TEST_DB_NAME", "espocityleague_test")
+TEMPLATE_DB_NAME = f"{TEST_DB_NAME}_template"
+
+os.environ.setdefault("DB_USER", "postgres")
+os.environ.setdefault("DB_PASSWORD", "postgres")
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ["DB_NAME"] = TEST_DB_NAME
+os.environ.setdefault("ADMIN_USERNAME", "admin")
+os.environ.setdefault("ADMIN_PHONE", "910000000")
+os.environ.setdefault("ADMIN_PASSWORD", "admin-password")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+
+# Registers every model with SQLModel, as the running app does
+import app.main  # noqa: E402,F401
+
+# Bets seeded by 0005 belong to users 2-5, which production created by signing up
+SEEDED_BETTORS = [(f"player{user_id}", f"91000000{user_id}") for user_id in range(2, 6)]
+
+
+def _server_connection():
+    import psycopg
+
+    return psycopg.connect(
+        host=os.environ["DB_HOST"],
+        port=os.environ["DB_PORT"],
+        user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"],
+        dbname="postgres",
+        autocommit=True,
+    )
+
+
+def _migrate_template() -> None:
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import NullPool
+    from sqlmodel import Session
+    from app.db import get_database_url
+    from app.services.tie_breaking import update_all_users_tie_breaking_stats
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+
+    os.environ["DB_NAME"] = TEMPLATE_DB_NAME
+    try:
+        command.upgrade(config, "0004_seed_stages_matches")
+        engine = create_engine(get_database_url(), poolclass=NullPool)
+        with engine.begin() as connection:
+            for username, phone in SEEDED_BETTORS:
+                connection.execute(
+                    text("INSERT INTO users (username, phone, hashed_password) VALUES (:username, :phone, 'x')"),
+                    {"username": username, "phone": phone},
+                )
+        command.upgrade(config, "head")
+        # Migrations leave the tie-breaking stats at their defaults
+        with Session(engine) as session:
+            update_all_users_tie_breaking_stats(session)
+        engine.dispose()
+    finally:
+        os.environ["DB_NAME"] = TEST_DB_NAME
+
+
+@pytest.fixture(scope="session")
+def database_template():
+    import psycopg
+
+    try:
+        connection = _server_connection()
+    except psycopg.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+
+    with connection:
+        connection.execute(f'DROP DATABASE IF EXISTS "{TEST_DB_NAME}" WITH (FORCE)')
+        connection.execute(f'DROP DATABASE IF EXISTS "{TEMPLATE_DB_NAME}" WITH (FORCE)')
+        connection.execute(f'CREATE DATABASE "{TEMPLATE_DB_NAME}"')
+        _migrate_template()
+        yield TEMPLATE_DB_NAME
+        connection.execute(f'DROP DATABASE IF EXISTS "{TEST_DB_NAME}" WITH (FORCE)')
+        connection.execute(f'DROP DATABASE IF EXISTS "{TEMPLATE_DB_NAME}" WITH (FORCE)')
+
+
+@pytest.fixture
+def database(database_template):
+    """A freshly migrated and seeded database for one test"""
+    from app.db import engine
+
+    engine.dispose()
+    with _server_connection() as connection:
+        connection.execute(f'DROP DATABASE IF EXISTS "{TEST_DB_NAME}" WITH (FORCE)')
+        connection.execute(f'CREATE DATABASE "{TEST_DB_NAME}" TEMPLATE "{database_template}"')
+    yield TEST_DB_NAME
+    engine.dispose()
+
+
+@pytest.fixture
+def session(database):
+    from sqlmodel import Session
+    from app.db import engine
+
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client(database):
+    """The API without its lifespan, so no background workers start"""
+    from fastapi.testclient import TestClient
+    from app.db import async_engine
+    from app.main import app
+
+    yield TestClient(app)
+    # Pooled psycopg async connections belong to the client's event loop, which is gone
+    async_engine.sync_engine.dispose(close=False)
+
+
+@pytest.fixture
+def auth_headers(client):
+    from app.security import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token('2')}"}
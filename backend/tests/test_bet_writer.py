@@ -0,0 +1,82 @@
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import select
+
+from app.models.match import Match
+from app.services import bet_writer as bet_writer_module
+from app.services.bet_writer import UPSERT, BetWriter, BetWriterBusy, _Write
+from tests.test_settlement import OPEN_STAGE_ID
+
+SUBMITTED_AT = datetime(2000, 1, 1)
+UNKNOWN_USER_ID = 999999
+
+
+def _upsert(user_id, match_id, home_score_prediction=1, away_score_prediction=0):
+    return _Write(
+        UPSERT,
+        (user_id, match_id),
+        (user_id, match_id, home_score_prediction, away_score_prediction, SUBMITTED_AT),
+    )
+
+
+def _open_match_id(session):
+    return session.exec(select(Match.id).where(Match.stage_id == OPEN_STAGE_ID).order_by(Match.id)).first()
+
+
+def test_failed_batch_only_fails_the_bad_write(session):
+    match_id = _open_match_id(session)
+    good = [_upsert(user_id, match_id) for user_id in (2, 3)]
+    bad = _upsert(UNKNOWN_USER_ID, match_id)
+    writer = BetWriter(max_batch=10, max_wait_ms=1, queue_limit=10)
+
+    writer._flush([good[0], bad, good[1]])
+
+    assert bad.future.exception() is not None
+    for write in good:
+        match_found, saved = write.future.result()
+        assert match_found and saved.user_id == write.key[0]
+    stored = session.execute(text("SELECT user_id FROM bets WHERE match_id = :id ORDER BY user_id"), {"id": match_id})
+    assert stored.scalars().all() == [2, 3]
+
+
+def test_write_not_taken_in_time_is_withdrawn(session, monkeypatch):
+    monkeypatch.setattr(bet_writer_module, "BET_WRITE_TIMEOUT_SECONDS", 0.05)
+    match_id = _open_match_id(session)
+    # Not started: nothing takes the write off the queue
+    writer = BetWriter(max_batch=10, max_wait_ms=1, queue_limit=10)
+
+    with pytest.raises(BetWriterBusy):
+        writer.upsert(2, match_id, 1, 0, SUBMITTED_AT)
+
+    write = writer._queue.get_nowait()
+    writer._flush([write])
+    assert write.future.cancelled()
+    assert session.execute(text("SELECT COUNT(*) FROM bets WHERE match_id = :id"), {"id": match_id}).scalar() == 0
+
+
+def test_write_taken_into_a_batch_outlives_the_timeout(session, monkeypatch):
+    monkeypatch.setattr(bet_writer_module, "BET_WRITE_TIMEOUT_SECONDS", 0.05)
+    match_id = _open_match_id(session)
+    writer = BetWriter(max_batch=10, max_wait_ms=1, queue_limit=10)
+    outcome = {}
+
+    def submit():
+        try:
+            outcome["result"] = writer.upsert(2, match_id, 1, 0, SUBMITTED_AT)
+        except Exception as e:
+            outcome["error"] = e
+
+    submitter = threading.Thread(target=submit)
+    submitter.start()
+    write = writer._queue.get(timeout=1)
+    # Taken by the flusher, then slower than the submitter's timeout
+    assert write.future.set_running_or_notify_cancel()
+    submitter.join(0.2)
+    assert submitter.is_alive()
+    write.future.set_result((True, None))
+    submitter.join(1)
+
+    assert outcome == {"result": (True, None)}
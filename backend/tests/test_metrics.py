@@ -0,0 +1,13 @@
+from app.security import create_access_token
+
+# The admin is created by the migrations before anyone signs up
+ADMIN_ID = 1
+
+
+def test_metrics_are_admin_only(client, auth_headers):
+    assert client.get("/api/metrics").status_code in (401, 403)
+    assert client.get("/api/metrics", headers=auth_headers).status_code == 403
+
+    response = client.get("/api/metrics", headers={"Authorization": f"Bearer {create_access_token(str(ADMIN_ID))}"})
+    assert response.status_code == 200
+    assert "leaderboard_cache_hit_ratio" in response.json()
@@ -0,0 +1,14 @@
+import asyncio
+
+from app.security import verify_password
+from app.services import password_hashing
+
+
+def test_pooled_hashing_runs_in_forkserver_workers():
+    try:
+        hashed = password_hashing.hash_password_pooled("kickoff")
+        assert verify_password("kickoff", hashed)
+        assert asyncio.run(password_hashing.verify_password_async("kickoff", hashed))
+        assert password_hashing._get_executor()._mp_context.get_start_method() == "forkserver"
+    finally:
+        password_hashing.shutdown()
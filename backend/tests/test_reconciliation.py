@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.services.rank_snapshots import rebuild_rank_snapshots
+from app.services.reconciliation import SettlementInProgress, reconcile
+from app.services.settlement import settle_matchday
+from app.services.settlement_worker import enqueue_settlement, process_next_job
+from app.services.stage_points import rebuild_stage_points
+from tests.test_settlement import OPEN_STAGE_ID, _assert_consistent, _place_bets, _stage_results
+
+
+def test_repair_fixes_drifted_bets_and_users(session):
+    session.execute(text("UPDATE users SET score = score + 7, defeats = defeats + 1 WHERE id = 2"))
+    session.execute(text("UPDATE bets SET points_awarded = 3 - points_awarded WHERE id IN (1, 2, 3)"))
+    session.commit()
+
+    report = reconcile(session)
+    assert report["bet_diffs"] == 3
+    assert report["user_diffs"] >= 1
+    assert not report["repaired"]
+
+    assert reconcile(session, repair=True)["repaired"]
+    _assert_consistent(session)
+
+
+def test_repair_refuses_while_a_settlement_is_queued(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    match, home_score, away_score = _stage_results(session, OPEN_STAGE_ID)[0]
+    enqueue_settlement(session, match, home_score, away_score)
+    session.commit()
+
+    with pytest.raises(SettlementInProgress):
+        reconcile(session, repair=True)
+
+    # Once the job ran there is nothing left to repair
+    assert process_next_job()
+    _assert_consistent(session)
+    assert not reconcile(session, repair=True)["repaired"]
+
+
+def test_failed_job_blocks_its_match_until_repaired(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    match, home_score, away_score = _stage_results(session, OPEN_STAGE_ID)[0]
+    first = enqueue_settlement(session, match, home_score, away_score)
+    session.commit()
+    session.execute(text("UPDATE settlement_jobs SET status = 'failed', error = 'boom' WHERE id = :id"), {"id": first.id})
+    enqueue_settlement(session, match, home_score + 1, away_score)
+    session.commit()
+
+    # The correction would settle relative to a result the bets never got
+    assert not process_next_job()
+    assert reconcile(session)["bet_diffs"] > 0
+
+    report = reconcile(session, repair=True)
+    assert report["repaired"]
+    assert report["superseded_jobs"] == 2
+    _assert_consistent(session)
+    statuses = session.execute(text("SELECT DISTINCT status FROM settlement_jobs")).scalars().all()
+    assert statuses == ["superseded"]
+
+
+def _derived_state(session):
+    stage_points = session.execute(text("SELECT * FROM user_stage_points ORDER BY user_id, stage_id")).all()
+    snapshots = session.execute(
+        text("""
+            SELECT stage_id, user_id, rank, score, correct_results, lone_wolf_victories, defeats
+            FROM user_rank_snapshots
+            ORDER BY stage_id, user_id
+        """)
+    ).all()
+    return stage_points, snapshots
+
+
+def test_repair_recomputes_only_what_the_drift_touched(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    settle_matchday(session, _stage_results(session, OPEN_STAGE_ID))
+    session.commit()
+    # Flip bets of the earliest stage, so every later snapshot moves too, and lose a ledger entry
+    session.execute(
+        text("""
+            UPDATE bets SET points_awarded = 3 - points_awarded
+            WHERE id IN (
+                SELECT b.id FROM bets AS b JOIN matches AS m ON m.id = b.match_id
+                WHERE m.stage_id = (SELECT id FROM stages ORDER BY date, id LIMIT 1)
+                ORDER BY b.id LIMIT 4
+            )
+        """)
+    )
+    session.execute(text("DELETE FROM score_events WHERE id = (SELECT MIN(id) FROM score_events WHERE match_id IS NOT NULL)"))
+    # As if settlement had awarded the wrong points, the aggregates follow the drifted bets
+    rebuild_stage_points(session)
+    rebuild_rank_snapshots(session, datetime.now())
+    session.commit()
+    drifted = _derived_state(session)
+
+    report = reconcile(session, repair=True)
+    assert report["bet_diffs"] == 4
+    assert report["ledger_diffs"] == 1
+    assert report["repaired"]
+    _assert_consistent(session)
+
+    repaired = _derived_state(session)
+    # Both the stage aggregates and the snapshots moved back
+    assert repaired[0] != drifted[0]
+    assert repaired[1] != drifted[1]
+    rebuild_stage_points(session)
+    rebuild_rank_snapshots(session, datetime.now())
+    assert _derived_state(session) == repaired
+    session.rollback()
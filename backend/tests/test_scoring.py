@@ -0,0 +1,76 @@
+import itertools
+import random
+
+import pytest
+from sqlalchemy import text
+
+from app.services.scoring import bet_points_sql, calculate_bet_points
+
+# Every score from 0-0 to 6-6, for predictions and results alike
+SCORES = list(itertools.product(range(7), repeat=2))
+
+
+def reference_bet_points(home_prediction, away_prediction, home_actual, away_actual):
+    """The original implementation from app.routers.matches, kept as the specification"""
+    if home_prediction == home_actual and away_prediction == away_actual:
+        return 3
+
+    if home_prediction > away_prediction:
+        predicted_result = "home_win"
+    elif home_prediction < away_prediction:
+        predicted_result = "away_win"
+    else:
+        predicted_result = "draw"
+
+    if home_actual > away_actual:
+        actual_result = "home_win"
+    elif home_actual < away_actual:
+        actual_result = "away_win"
+    else:
+        actual_result = "draw"
+
+    if predicted_result == actual_result:
+        return 1
+    return 0
+
+
+def _random_bets(seed, count, high):
+    rng = random.Random(seed)
+    return [tuple(rng.randint(0, high) for _ in range(4)) for _ in range(count)]
+
+
+def test_scalar_matches_reference_on_every_small_score():
+    for (home_prediction, away_prediction), (home_actual, away_actual) in itertools.product(SCORES, SCORES):
+        assert calculate_bet_points(home_prediction, away_prediction, home_actual, away_actual) == reference_bet_points(
+            home_prediction, away_prediction, home_actual, away_actual
+        )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_scalar_matches_reference_on_random_scores(seed):
+    for bet in _random_bets(seed, 500, 30):
+        assert calculate_bet_points(*bet) == reference_bet_points(*bet)
+
+
+def test_sql_expression_matches_reference(session):
+    bets = [prediction + result for prediction, result in itertools.product(SCORES, SCORES)]
+    home_predictions, away_predictions, home_actual, away_actual = map(list, zip(*bets))
+    rows = session.execute(
+        text(f"""
+            SELECT {bet_points_sql("hp", "ap", "ha", "aa")} AS points
+            FROM unnest(
+                CAST(:home_predictions AS integer[]),
+                CAST(:away_predictions AS integer[]),
+                CAST(:home_actual AS integer[]),
+                CAST(:away_actual AS integer[])
+            ) WITH ORDINALITY AS b(hp, ap, ha, aa, position)
+            ORDER BY position
+        """),
+        {
+            "home_predictions": home_predictions,
+            "away_predictions": away_predictions,
+            "home_actual": home_actual,
+            "away_actual": away_actual,
+        },
+    ).scalars().all()
+    assert rows == [reference_bet_points(*bet) for bet in bets]
@@ -0,0 +1,222 @@
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel import select
+
+from app.models.match import Match
+from app.services.rank_snapshots import rebuild_rank_snapshots
+from app.services.reconciliation import reconcile
+from app.services.settlement import settle_match, settle_matchday
+
+# Matchday 3 has no results and no bets in the seed
+OPEN_STAGE_ID = 3
+
+
+def _place_bets(session, stage_id):
+    """Every user bets on every match of the stage, with a mix of exact, correct and wrong predictions"""
+    session.execute(
+        text("""
+            INSERT INTO bets (user_id, match_id, home_score_prediction, away_score_prediction, points_awarded,
+                              created_at, updated_at)
+            SELECT u.id, m.id, (u.id + m.id) % 3, (u.id * m.id) % 3, 0, now(), now()
+            FROM users AS u
+            CROSS JOIN matches AS m
+            WHERE m.stage_id = :stage_id
+        """),
+        {"stage_id": stage_id},
+    )
+    session.commit()
+
+
+def _stage_results(session, stage_id):
+    matches = session.exec(select(Match).where(Match.stage_id == stage_id).order_by(Match.id)).all()
+    return [(match, match.id % 3, (match.id // 3) % 3) for match in matches]
+
+
+def _assert_consistent(session):
+    report = reconcile(session)
+    assert report["bet_diffs"] == 0, report["bet_diff_samples"]
+    assert report["user_diffs"] == 0, report["user_diff_samples"]
+    assert report["ledger_diffs"] == 0
+
+
+def test_seeded_database_is_consistent(session):
+    _assert_consistent(session)
+
+
+def test_bulk_settled_stage_reconciles(session):
+    _place_bets(session, OPEN_STAGE_ID)
+
+    summary = settle_matchday(session, _stage_results(session, OPEN_STAGE_ID))
+    session.commit()
+
+    assert len(summary["matches"]) == 18
+    assert all(match["status"] == "settled" for match in summary["matches"])
+    _assert_consistent(session)
+
+
+def _expected_stage_points(session, stage_id):
+    """Per-user stage aggregates computed in Python from the bets and results"""
+    rows = session.execute(
+        text("""
+            SELECT b.user_id, b.match_id, b.home_score_prediction, b.away_score_prediction, b.points_awarded,
+                   m.home_score, m.away_score
+            FROM bets AS b
+            JOIN matches AS m ON m.id = b.match_id
+            WHERE m.stage_id = :stage_id AND m.home_score IS NOT NULL AND m.away_score IS NOT NULL
+        """),
+        {"stage_id": stage_id},
+    ).all()
+    exact_hits_per_match = {}
+    for row in rows:
+        if (row.home_score_prediction, row.away_score_prediction) == (row.home_score, row.away_score):
+            exact_hits_per_match[row.match_id] = exact_hits_per_match.get(row.match_id, 0) + 1
+
+    expected = {}
+    for row in rows:
+        stats = expected.setdefault(row.user_id, {"points": 0, "exact_hits": 0, "lone_wolves": 0, "defeats": 0})
+        is_exact = (row.home_score_prediction, row.away_score_prediction) == (row.home_score, row.away_score)
+        stats["points"] += row.points_awarded
+        stats["exact_hits"] += is_exact
+        stats["lone_wolves"] += is_exact and exact_hits_per_match[row.match_id] == 1
+        stats["defeats"] += row.points_awarded == 0
+    return expected
+
+
+def _stored_stage_points(session, stage_id):
+    rows = session.execute(
+        text("""
+            SELECT user_id, points, exact_hits, lone_wolves, defeats
+            FROM user_stage_points
+            WHERE stage_id = :stage_id
+        """),
+        {"stage_id": stage_id},
+    ).mappings().all()
+    return {row["user_id"]: {key: row[key] for key in ("points", "exact_hits", "lone_wolves", "defeats")} for row in rows}
+
+
+def test_bulk_settlement_fills_stage_points(session):
+    _place_bets(session, OPEN_STAGE_ID)
+
+    settle_matchday(session, _stage_results(session, OPEN_STAGE_ID))
+    session.commit()
+
+    stored = _stored_stage_points(session, OPEN_STAGE_ID)
+    assert len(stored) == 6
+    assert stored == _expected_stage_points(session, OPEN_STAGE_ID)
+
+
+def test_single_match_settlement_and_corrections_keep_stage_points(session):
+    _place_bets(session, OPEN_STAGE_ID)
+
+    for match, home_score, away_score in _stage_results(session, OPEN_STAGE_ID):
+        settle_match(session, match, home_score, away_score)
+        session.commit()
+    # Correct a few results, including to and from exact hits
+    for match, home_score, away_score in _stage_results(session, OPEN_STAGE_ID)[:5]:
+        settle_match(session, match, away_score, home_score + 1)
+        session.commit()
+
+    assert _stored_stage_points(session, OPEN_STAGE_ID) == _expected_stage_points(session, OPEN_STAGE_ID)
+    _assert_consistent(session)
+
+
+def _snapshots(session, stage_id):
+    rows = session.execute(
+        text("""
+            SELECT user_id, rank, score, correct_results, lone_wolf_victories, defeats
+            FROM user_rank_snapshots
+            WHERE stage_id = :stage_id
+        """),
+        {"stage_id": stage_id},
+    ).mappings().all()
+    return {row["user_id"]: dict(row) for row in rows}
+
+
+def _current_standings(session):
+    """The live leaderboard, which a snapshot of the latest settled stage must equal"""
+    rows = session.execute(
+        text("""
+            SELECT id AS user_id,
+                   RANK() OVER (
+                       ORDER BY score DESC, correct_results DESC, lone_wolf_victories DESC, defeats ASC
+                   ) AS rank,
+                   score, correct_results, lone_wolf_victories, defeats
+            FROM users
+        """)
+    ).mappings().all()
+    return {row["user_id"]: dict(row) for row in rows}
+
+
+def test_bulk_settlement_of_a_whole_stage_snapshots_ranks(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    assert _snapshots(session, OPEN_STAGE_ID) == {}
+
+    settle_matchday(session, _stage_results(session, OPEN_STAGE_ID))
+    session.commit()
+
+    snapshots = _snapshots(session, OPEN_STAGE_ID)
+    assert len(snapshots) == 6
+    assert snapshots == _current_standings(session)
+
+
+def test_stage_is_snapshotted_once_its_last_match_is_settled(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    results = _stage_results(session, OPEN_STAGE_ID)
+
+    for match, home_score, away_score in results[:-1]:
+        settle_match(session, match, home_score, away_score)
+        session.commit()
+    assert _snapshots(session, OPEN_STAGE_ID) == {}
+
+    match, home_score, away_score = results[-1]
+    settle_match(session, match, home_score, away_score)
+    session.commit()
+    assert _snapshots(session, OPEN_STAGE_ID) == _current_standings(session)
+
+    # A correction re-snapshots the stage
+    settle_match(session, match, away_score + 2, home_score)
+    session.commit()
+    assert _snapshots(session, OPEN_STAGE_ID) == _current_standings(session)
+
+
+def test_rebuilt_snapshots_add_up_every_stage_up_to_their_own(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    settle_matchday(session, _stage_results(session, OPEN_STAGE_ID))
+    session.commit()
+    rebuild_rank_snapshots(session, datetime.now())
+    session.commit()
+
+    stages = session.execute(text("SELECT id, date FROM stages")).all()
+    stage_points = session.execute(
+        text("SELECT user_id, stage_id, points, exact_hits, lone_wolves, defeats FROM user_stage_points")
+    ).all()
+    openings = dict(
+        session.execute(
+            text("SELECT user_id, SUM(delta) FROM score_events WHERE match_id IS NULL GROUP BY user_id")
+        ).all()
+    )
+    user_ids = session.execute(text("SELECT id FROM users")).scalars().all()
+    stage_dates = dict(stages)
+    snapshotted = session.execute(text("SELECT DISTINCT stage_id FROM user_rank_snapshots")).scalars().all()
+    assert len(snapshotted) > 1
+
+    for stage_id in snapshotted:
+        totals = {user_id: [openings.get(user_id, 0), 0, 0, 0] for user_id in user_ids}
+        for row in stage_points:
+            if stage_dates[row.stage_id] <= stage_dates[stage_id]:
+                for i, value in enumerate((row.points, row.exact_hits, row.lone_wolves, row.defeats)):
+                    totals[row.user_id][i] += value
+        order = {user_id: (-score, -correct, -lone, defeats) for user_id, (score, correct, lone, defeats) in totals.items()}
+        expected = {
+            user_id: {
+                "user_id": user_id,
+                "rank": 1 + sum(other < order[user_id] for other in order.values()),
+                "score": score,
+                "correct_results": correct,
+                "lone_wolf_victories": lone,
+                "defeats": defeats,
+            }
+            for user_id, (score, correct, lone, defeats) in totals.items()
+        }
+        assert _snapshots(session, stage_id) == expected
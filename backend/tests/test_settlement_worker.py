@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.db import engine
+from app.models.match import Match
+from app.services.settlement_worker import enqueue_settlement, process_next_job
+from tests.test_settlement import OPEN_STAGE_ID, _assert_consistent, _place_bets, _stage_results
+
+
+def _drain():
+    while process_next_job():
+        pass
+
+
+def test_overlapping_submissions_of_one_result_queue_one_job(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    match_id = _stage_results(session, OPEN_STAGE_ID)[0][0].id
+    with Session(engine) as other:
+        # Both read the match before either recorded its result
+        first = session.get(Match, match_id)
+        second = other.get(Match, match_id)
+        assert enqueue_settlement(session, first, 1, 0) is not None
+        session.commit()
+        assert enqueue_settlement(other, second, 1, 0) is None
+        other.commit()
+
+    _drain()
+    assert session.execute(text("SELECT COUNT(*) FROM settlement_jobs")).scalar() == 1
+    _assert_consistent(session)
+
+
+def test_overlapping_submissions_of_different_results_queue_a_correction(session):
+    _place_bets(session, OPEN_STAGE_ID)
+    match_id = _stage_results(session, OPEN_STAGE_ID)[0][0].id
+    with Session(engine) as other:
+        first = session.get(Match, match_id)
+        second = other.get(Match, match_id)
+        enqueue_settlement(session, first, 1, 0)
+        session.commit()
+        correction = enqueue_settlement(other, second, 2, 2)
+        assert (correction.previous_home_score, correction.previous_away_score) == (1, 0)
+        other.commit()
+
+    _drain()
+    _assert_consistent(session)
+
+
+def test_failed_attempt_is_retried_after_a_delay(session, monkeypatch):
+    from app.services import settlement_worker
+
+    _place_bets(session, OPEN_STAGE_ID)
+    match, home_score, away_score = _stage_results(session, OPEN_STAGE_ID)[0]
+    job = enqueue_settlement(session, match, home_score, away_score)
+    session.commit()
+
+    def flaky(*args):
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(settlement_worker, "settle_result", flaky)
+    assert process_next_job()
+    # Back in the queue, but not claimed again straight away
+    assert not process_next_job()
+    session.refresh(job)
+    assert (job.status, job.attempts, job.error) == ("pending", 1, "connection reset")
+    assert job.available_at > datetime.now()
+
+    monkeypatch.undo()
+    session.execute(text("UPDATE settlement_jobs SET available_at = now() WHERE id = :id"), {"id": job.id})
+    session.commit()
+    assert process_next_job()
+    session.refresh(job)
+    assert (job.status, job.attempts) == ("done", 2)
+    _assert_consistent(session)
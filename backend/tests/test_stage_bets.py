@@ -0,0 +1,50 @@
+from app.routers.stages import COMPACT_STAGE_BETS_MEDIA_TYPE
+
+# Matchday 1 has results and bets in the seed
+SETTLED_STAGE_ID = 1
+
+
+def _decode_compact(body):
+    """Expand the users x matches grid into the (user, match, home, away, points) of each bet"""
+    bets = set()
+    for user_id, row in zip(body["user_ids"], body["grid"]):
+        for match_id, cell in zip(body["match_ids"], row):
+            if cell is not None:
+                bets.add((user_id, match_id, *cell))
+    return bets
+
+
+def _decode_json(body):
+    return {
+        (
+            bet["user"]["id"],
+            bet["match"]["id"],
+            bet["home_score_prediction"],
+            bet["away_score_prediction"],
+            bet["points_awarded"],
+        )
+        for bet in body
+    }
+
+
+def test_compact_and_json_forms_hold_the_same_bets(client, auth_headers):
+    url = f"/api/stages/{SETTLED_STAGE_ID}/bets"
+    plain = client.get(url, headers=auth_headers)
+    streamed = client.get(url, params={"stream": "true"}, headers=auth_headers)
+    compact = client.get(url, headers={**auth_headers, "Accept": COMPACT_STAGE_BETS_MEDIA_TYPE})
+
+    for response in (plain, streamed, compact):
+        assert response.status_code == 200
+        assert response.headers["Vary"] == "Accept"
+
+    bets = _decode_json(plain.json())
+    assert bets
+    assert _decode_json(streamed.json()) == bets
+    assert _decode_compact(compact.json()) == bets
+    # The users and matches sent once carry what each JSON bet repeats
+    compact_body = compact.json()
+    for bet in plain.json():
+        assert compact_body["users"][str(bet["user"]["id"])]["username"] == bet["user"]["username"]
+        match = compact_body["matches"][str(bet["match"]["id"])]
+        assert match["home_team_id"] == bet["match"]["home_team"]["id"]
+        assert compact_body["teams"][str(match["away_team_id"])]["name"] == bet["match"]["away_team"]["name"]
@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app.db import async_engine
+from app.models.match import Match
+from app.models.stage import Stage
+from tests.test_settlement import OPEN_STAGE_ID, _place_bets
+
+
+@contextmanager
+def _count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _add_stage(session, match_count):
+    stage = Stage(name=f"Synthetic {match_count}", date=datetime(2030, 1, 1))
+    session.add(stage)
+    session.flush()
+    for index in range(match_count):
+        session.add(Match(
+            home_team_id=1,
+            away_team_id=2,
+            stage_id=stage.id,
+            kickoff_at=datetime(2030, 1, 1, 12 + index % 10),
+        ))
+    session.commit()
+    return stage.id
+
+
+def _statements_for(client, auth_headers, stage_id, expected_status=200):
+    with _count_statements() as statements:
+        response = client.get(f"/api/stages/{stage_id}/matches", headers=auth_headers)
+    assert response.status_code == expected_status
+    return len(statements), response
+
+
+def test_stage_matches_take_one_query_whatever_the_stage_size(session, client, auth_headers):
+    _place_bets(session, OPEN_STAGE_ID)
+    small = _add_stage(session, 1)
+    large = _add_stage(session, 40)
+    # The first request also loads the user into the per-process cache
+    client.get(f"/api/stages/{small}/matches", headers=auth_headers)
+
+    counts = {}
+    for stage_id, match_count in ((small, 1), (OPEN_STAGE_ID, 18), (large, 40)):
+        counts[stage_id], response = _statements_for(client, auth_headers, stage_id)
+        assert len(response.json()) == match_count
+        if stage_id == OPEN_STAGE_ID:
+            # The user's bets come from the same query
+            assert all(match["user_bet"] is not None for match in response.json())
+    assert set(counts.values()) == {1}
+
+
+def test_empty_and_missing_stages_take_two_queries(session, client, auth_headers):
+    empty = _add_stage(session, 0)
+    client.get(f"/api/stages/{empty}/matches", headers=auth_headers)
+
+    count, response = _statements_for(client, auth_headers, empty)
+    assert (count, response.json()) == (2, [])
+    count, _ = _statements_for(client, auth_headers, 999999, expected_status=404)
+    assert count == 2
@@ -0,0 +1,54 @@
+from sqlmodel import select
+
+from app.models.user import User
+from app.services.tie_breaking import calculate_tie_breaking_stats, update_all_users_tie_breaking_stats
+
+TIE_BREAKING_FIELDS = ("correct_results", "lone_wolf_victories", "defeats")
+
+
+def _stored_stats(session):
+    session.expire_all()
+    return {
+        user.id: {field: getattr(user, field) for field in TIE_BREAKING_FIELDS}
+        for user in session.exec(select(User).order_by(User.id)).all()
+    }
+
+
+def test_single_pass_matches_per_user_calculation_on_seed_data(session):
+    # Start from zeroed stats so the single pass has to write every value
+    for user in session.exec(select(User)).all():
+        user.correct_results = user.lone_wolf_victories = user.defeats = 0
+        session.add(user)
+    session.commit()
+
+    update_all_users_tie_breaking_stats(session)
+
+    stored = _stored_stats(session)
+    expected = {user_id: calculate_tie_breaking_stats(session, user_id) for user_id in stored}
+    assert stored == expected
+    # The seed has settled matches, so the comparison is not trivially all zeros
+    assert any(stats["correct_results"] for stats in stored.values())
+    assert any(stats["lone_wolf_victories"] for stats in stored.values())
+    assert any(stats["defeats"] for stats in stored.values())
+
+
+def test_single_pass_matches_per_user_calculation_after_results_change(session):
+    from sqlalchemy import text
+
+    # Give a few unsettled matches results, some hit exactly by one or several bettors
+    session.execute(text("""
+        UPDATE matches AS m
+        SET home_score = b.home_score_prediction, away_score = b.away_score_prediction
+        FROM (
+            SELECT DISTINCT ON (match_id) match_id, home_score_prediction, away_score_prediction
+            FROM bets
+            ORDER BY match_id, id
+        ) AS b
+        WHERE m.id = b.match_id AND m.id % 3 = 0
+    """))
+    session.commit()
+
+    update_all_users_tie_breaking_stats(session)
+
+    stored = _stored_stats(session)
+    assert stored == {user_id: calculate_tie_breaking_stats(session, user_id) for user_id in stored}